@@ -0,0 +1,138 @@
+"""Статистика вопросов по журналу ответов учеников.
+
+Отчёт читает только сводные таблицы question_stats и distractor_stats, которые триггеры
+ResultsDatabase поддерживают при каждой записи в журнал, поэтому он открывается сразу при любом
+объёме истории. rebuild_statistics пересчитывает сводки по журналу целиком (группировками SQL).
+
+    python analytics.py              # отчёт по вопросам
+    python analytics.py --rebuild    # пересчёт сводных таблиц по журналу
+"""
+import argparse
+import math
+
+from main import Database, ResultsDatabase
+
+# Сколько самых частых неправильных ответов показывать по каждому вопросу
+TOP_DISTRACTORS = 3
+
+
+def discrimination_index(scored, scored_correct, sum_score, sum_score_sq, sum_correct_score):
+    """Точечно-бисериальная корреляция правильности ответа с долей баллов за попытку.
+
+    Считается по накопленным суммам; None, если попыток мало или все ответили одинаково.
+    """
+    if scored < 2:
+        return None
+    variance_correct = scored * scored_correct - scored_correct * scored_correct
+    variance_score = scored * sum_score_sq - sum_score * sum_score
+    if variance_correct <= 0 or variance_score <= 1e-12:
+        return None
+    return (scored * sum_correct_score - scored_correct * sum_score) / math.sqrt(variance_correct * variance_score)
+
+
+def item_statistics(results_database, min_answers=1, questions=None):
+    """Сложность и дискриминация вопросов, самые трудные первыми.
+
+    Тексты вопросов берутся из questions - источников с методом get_question (Database, QuizPack),
+    первого, где вопрос нашёлся. Без них текст берётся из базы вопросов, к сессии которой подключена
+    база результатов; у самостоятельной базы результатов (место ученика с пакетами) текстов нет.
+    Возвращает список (id вопроса, текст, число ответов, доля правильных, индекс дискриминации).
+    """
+    schema = results_database.schema
+    joined = questions is None and schema != "main"
+    text = "COALESCE(q.question, '(вопрос удалён)')" if joined else "NULL"
+    join = "LEFT JOIN main.questions q ON q.id = s.question_id" if joined else ""
+    results_database.cursor.execute(f"""
+        SELECT s.question_id, {text}, s.answered, s.correct,
+               s.scored, s.scored_correct, s.sum_score, s.sum_score_sq, s.sum_correct_score
+        FROM {schema}.question_stats s {join}
+        WHERE s.answered >= ?
+        ORDER BY s.correct * 1.0 / s.answered, s.answered DESC
+    """, (min_answers,))
+    statistics = [(question_id, question, answered, correct / answered, discrimination_index(*sums))
+                  for question_id, question, answered, correct, *sums in results_database.cursor.fetchall()]
+    if joined:
+        return statistics
+    return [(question_id, question_text(questions or (), question_id), *rest)
+            for question_id, _, *rest in statistics]
+
+
+def question_text(sources, question_id):
+    """Текст вопроса из первого источника, где он есть."""
+    for source in sources:
+        row = source.get_question(question_id)
+        if row is not None:
+            return row[1]
+    return "(вопрос удалён)" if sources else "(нет текста вопроса)"
+
+
+def distractors(results_database, top=TOP_DISTRACTORS):
+    """Самые частые неправильные ответы по вопросам: {id вопроса: [(ответ, сколько раз), ...]}."""
+    results_database.cursor.execute(f"""
+        SELECT question_id, answer, count FROM (
+            SELECT question_id, answer, count,
+                   ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY count DESC, answer_key) AS place
+            FROM {results_database.schema}.distractor_stats
+        ) WHERE place <= ?
+    """, (top,))
+    frequent = {}
+    for question_id, answer, count in results_database.cursor.fetchall():
+        frequent.setdefault(question_id, []).append((answer, count))
+    return frequent
+
+
+def rebuild_statistics(results_database):
+    """Пересчёт сводных таблиц по всему журналу одной транзакцией (например, после слияния баз)."""
+    schema = results_database.schema
+    with results_database.manager.transaction():
+        results_database.cursor.execute(f"DELETE FROM {schema}.question_stats")
+        results_database.cursor.execute(f"DELETE FROM {schema}.distractor_stats")
+        results_database.cursor.execute(f"""
+            INSERT INTO {schema}.question_stats (question_id, answered, correct, scored, scored_correct,
+                                                 sum_score, sum_score_sq, sum_correct_score)
+            SELECT a.question_id, COUNT(*), SUM(a.correct), COUNT(t.share),
+                   SUM(CASE WHEN t.share IS NULL THEN 0 ELSE a.correct END),
+                   TOTAL(t.share), TOTAL(t.share * t.share), TOTAL(a.correct * t.share)
+            FROM {schema}.answers a
+            LEFT JOIN (SELECT id, score * 1.0 / question_count AS share FROM {schema}.attempts
+                       WHERE score IS NOT NULL AND question_count > 0) t ON t.id = a.attempt_id
+            GROUP BY a.question_id
+        """)
+        results_database.cursor.execute(f"""
+            INSERT INTO {schema}.distractor_stats (question_id, answer_key, answer, count)
+            SELECT question_id, answer_key, MIN(answer), COUNT(*) FROM {schema}.answers
+            WHERE correct = 0 GROUP BY question_id, answer_key
+        """)
+
+
+def format_report(statistics, frequent):
+    """Текст отчёта: строка на вопрос."""
+    lines = []
+    for question_id, question, answered, difficulty, discrimination in statistics:
+        index = "-" if discrimination is None else f"{discrimination:+.2f}"
+        wrong = ", ".join(f"{answer} ({count})" for answer, count in frequent.get(question_id, []))
+        lines.append(f"{question_id:>6} {difficulty:>6.0%} {index:>6} {answered:>6}  {question}"
+                     + (f"  | ошибки: {wrong}" if wrong else ""))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статистика вопросов по журналу ответов")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать сводные таблицы по журналу")
+    parser.add_argument("--min-answers", type=int, default=1, help="не показывать вопросы с меньшим числом ответов")
+    args = parser.parse_args()
+
+    database = Database()
+    results_database = ResultsDatabase(manager=database.manager)
+    try:
+        if args.rebuild:
+            rebuild_statistics(results_database)
+        print("    id  верно  дискр. ответов  вопрос")
+        print(format_report(item_statistics(results_database, args.min_answers), distractors(results_database)))
+    finally:
+        results_database.close()
+        database.manager.close()
+
+
+if __name__ == '__main__':
+    main()
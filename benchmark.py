@@ -0,0 +1,218 @@
+"""Нагрузочные замеры слоя баз данных без окон Qt.
+
+Генерирует синтетические банки вопросов и истории результатов заданных размеров, замеряет
+операции Database/ResultsDatabase и одновременную работу N учеников, сохраняет пропускную
+способность и перцентили задержек в JSON и сравнивает их с сохранённым эталоном.
+
+    python benchmark.py --sizes 1000 100000 --students 50 --output bench.json
+    python benchmark.py --sizes 1000 100000 --baseline bench.json   # код возврата 1 при замедлении
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from main import (
+    Database, ResultsDatabase, is_answer_correct, question_hash, IMPORT_BATCH_SIZE
+)
+
+# Допустимое замедление медианы относительно эталона
+DEFAULT_TOLERANCE = 1.5
+# Рост медианы меньше этого порога (мс) считается шумом, каким бы ни было отношение
+DEFAULT_NOISE_FLOOR_MS = 5.0
+# Меньше замеров - медиана случайна, операция в проверку замедлений не входит
+MIN_GATE_SAMPLES = 10
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по отсортированному списку (ближайший ранг)."""
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, items=1, gated=True):
+    """Сводка по замерам: число операций, ops/s, перцентили в миллисекундах.
+
+    gated=False - операция не входит в проверку замедлений (задержки одновременных учеников
+    зависят от планировщика потоков больше, чем от кода).
+    """
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "count": len(latencies),
+        "ops_per_second": len(latencies) * items / total if total else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "gated": gated,
+    }
+
+
+def timed(function, *args):
+    """Выполнение функции с замером времени. Возвращает (результат, секунды)."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def generate_question_bank(database, size, seed=1):
+    """Синтетический банк из size вопросов-примеров (вставка одной транзакцией).
+
+    Вопросы вставляются тем же путём, что и импорт (upsert_questions): с хешем текста и ключами
+    ответов, поэтому банк устроен так же, как настоящий. Номер в тексте делает вопросы различными.
+    """
+    rng = random.Random(seed)
+    with database.manager.transaction():
+        for start in range(0, size, IMPORT_BATCH_SIZE):
+            rows = []
+            for number in range(start, min(start + IMPORT_BATCH_SIZE, size)):
+                a, b = rng.randint(1, 1000), rng.randint(1, 1000)
+                question = f"Пример {number + 1}: {a} + {b}"
+                rows.append((question, str(a + b), (), question_hash(question)))
+            database.upsert_questions(rows, update_answers=False)
+
+
+def generate_result_history(results_database, size, seed=1):
+    """Синтетическая история из size результатов."""
+    rng = random.Random(seed)
+    with results_database.manager.transaction():
+        for start in range(0, size, IMPORT_BATCH_SIZE):
+            rows = [(f"Ученик {rng.randint(1, 500)}", rng.randint(0, 20))
+                    for _ in range(min(IMPORT_BATCH_SIZE, size - start))]
+            results_database.cursor.executemany(
+                f"INSERT INTO {results_database.schema}.results (name, score) VALUES (?, ?)", rows)
+
+
+def write_question_file(filename, size, seed=2):
+    """Текстовый файл вопросов в формате 'вопрос;ответ' для замера импорта."""
+    rng = random.Random(seed)
+    with open(filename, 'w', encoding='utf-8') as file:
+        for _ in range(size):
+            a, b = rng.randint(1, 1000), rng.randint(1, 1000)
+            file.write(f"{a} * {b};{a * b}\n")
+
+
+def simulate_student(index, questions_per_quiz, samples):
+    """Один ученик: выборка, показ и проверка каждого вопроса, запись результата."""
+    database = Database()
+    results_database = ResultsDatabase()
+    try:
+        question_ids, elapsed = timed(database.draw_questions, questions_per_quiz, index)
+        samples["student.draw"].append(elapsed)
+        score = 0
+        for question_id in question_ids:
+            start = time.perf_counter()
+            question = database.get_question(question_id)
+            answer_keys = database.get_answer_keys(question_id)
+            score += is_answer_correct(question[2], answer_keys)
+            samples["student.answer"].append(time.perf_counter() - start)
+        _, elapsed = timed(results_database.insert_result, f"Ученик {index}", score)
+        samples["student.insert_result"].append(elapsed)
+    finally:
+        database.manager.close()
+
+
+def run_size(size, students, questions_per_quiz, repeat):
+    """Все замеры для банка и истории результатов размера size."""
+    report = {}
+    database = Database()
+    results_database = ResultsDatabase()
+    _, elapsed = timed(generate_question_bank, database, size)
+    report["generate_questions"] = summarize([elapsed], size)
+    generate_result_history(results_database, size)
+
+    report["get_questions"] = summarize([timed(database.get_questions)[1] for _ in range(repeat)])
+    report["get_results"] = summarize([timed(results_database.get_results)[1] for _ in range(repeat)])
+    report["insert_question"] = summarize(
+        [timed(database.insert_question, f"Вопрос {i}", str(i))[1] for i in range(repeat * 20)])
+    report["insert_result"] = summarize(
+        [timed(results_database.insert_result, f"Ученик {i}", i)[1] for i in range(repeat * 20)])
+
+    import_size = min(size, 100000)
+    write_question_file("import.txt", import_size)
+    report["load_questions_from_txt"] = summarize([timed(database.load_questions_from_txt, "import.txt")[1]],
+                                                  import_size)
+
+    samples = {"student.draw": [], "student.answer": [], "student.insert_result": []}
+    threads = [threading.Thread(target=simulate_student, args=(index, questions_per_quiz, samples))
+               for index in range(students)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    for name, latencies in samples.items():
+        if latencies:
+            report[name] = summarize(latencies, gated=False)
+    report["student.quizzes_per_second"] = {"ops_per_second": students / wall if wall else 0.0}
+
+    results_database.close()
+    database.manager.close()
+    return report
+
+
+def check_regressions(current, baseline, tolerance, noise_floor_ms=DEFAULT_NOISE_FLOOR_MS):
+    """Список операций, медиана которых выросла больше чем в tolerance раз и больше чем на noise_floor_ms.
+
+    Не проверяются операции с gated=False и замеренные меньше MIN_GATE_SAMPLES раз (однократные
+    генерация банка и импорт) сейчас или в эталоне.
+    """
+    regressions = []
+    for size, operations in current.items():
+        for name, stats in operations.items():
+            reference = baseline.get(size, {}).get(name, {})
+            if "p50_ms" not in stats or not stats.get("gated", True) or not reference.get("p50_ms") \
+                    or min(stats["count"], reference.get("count", 0)) < MIN_GATE_SAMPLES:
+                continue
+            if stats["p50_ms"] > reference["p50_ms"] * tolerance \
+                    and stats["p50_ms"] - reference["p50_ms"] > noise_floor_ms:
+                regressions.append(f"{name}@{size}: {stats['p50_ms']:.2f} мс против {reference['p50_ms']:.2f} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные замеры слоя баз данных")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--students", type=int, default=30, help="число одновременных учеников")
+    parser.add_argument("--questions", type=int, default=20, help="вопросов в одной попытке")
+    parser.add_argument("--repeat", type=int, default=MIN_GATE_SAMPLES)
+    parser.add_argument("--output", help="файл для сохранения результатов (JSON)")
+    parser.add_argument("--baseline", help="эталонный файл для проверки замедлений")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--noise-floor", type=float, default=DEFAULT_NOISE_FLOOR_MS,
+                        help="рост медианы (мс), который не считается замедлением")
+    args = parser.parse_args()
+
+    report = {}
+    initial_directory = os.getcwd()
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)  # Database и ResultsDatabase создают папку db в текущем каталоге
+            try:
+                report[str(size)] = run_size(size, args.students, args.questions, args.repeat)
+            finally:
+                os.chdir(initial_directory)
+        for name, stats in report[str(size)].items():
+            latency = f"p50 {stats['p50_ms']:.2f} мс, p99 {stats['p99_ms']:.2f} мс" if "p50_ms" in stats else ""
+            print(f"{size:>8} {name:<28} {stats['ops_per_second']:>12.1f} оп/с  {latency}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = check_regressions(report, json.load(file), args.tolerance, args.noise_floor)
+        for line in regressions:
+            print(f"Замедление: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
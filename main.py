@@ -1,79 +1,1416 @@
 import sys
+import time
+
+# Момент запуска программы - от него отсчитываются этапы запуска (см. startup_phase)
+STARTUP_STARTED = time.perf_counter()
+
 from PyQt6.QtWidgets import (
-    QMainWindow, QLabel, QLineEdit, QListWidget, QFileDialog
+    QMainWindow, QLabel, QLineEdit, QListWidget, QListView, QFileDialog, QAbstractItemView, QProgressDialog,
+    QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QStackedWidget
 )
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QInputDialog, QMessageBox
+# Модули, нужные не при каждом запуске (ast, decimal, inspect, pathlib, concurrent.futures,
+# multiprocessing, http.client), импортируются в функциях при первом использовании, чтобы не
+# замедлять холодный запуск
 import os
+import atexit
+import bisect
+import codecs
+import csv
+import functools
+import hashlib
+import json
+import math
+import mmap
+import operator
+import queue
+import random
+import re
+import struct
+import threading
 import sqlite3
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from PyQt6.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QLineEdit, QPushButton, QTextEdit, QApplication,
     QMessageBox
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QAbstractListModel, QModelIndex, QObject, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap
+
+# Количество строк, вставляемых одним executemany при импорте
+IMPORT_BATCH_SIZE = 1000
+# Количество вопросов, подгружаемых моделью списка за один fetchMore
+QUESTION_PAGE_SIZE = 200
+# Размер куска при потоковом чтении и записи изображений вопросов (BLOB)
+MEDIA_CHUNK_SIZE = 64 * 1024
+# Сколько подготовленных изображений держит кэш окна ученика
+MEDIA_CACHE_SIZE = 32
+# Изображения крупнее уменьшаются до этого размера ещё в фоновом потоке
+MEDIA_MAX_WIDTH = 1280
+MEDIA_MAX_HEIGHT = 720
+# Сколько записей (вопросов, ключей ответов, страниц списка) держит общий кэш вопросов
+QUESTION_CACHE_SIZE = 5000
+# Максимальное число параметров в одном запросе "WHERE id IN (...)"
+SQL_IN_CHUNK_SIZE = 500
+# Ожидание снятия блокировки базы данных другим процессом
+BUSY_TIMEOUT_SECONDS = 10
+# Размер кэша подготовленных SQL-выражений соединения
+STATEMENT_CACHE_SIZE = 256
+# Сколько ждать новых результатов, чтобы записать их одной транзакцией (group commit)
+GROUP_COMMIT_DELAY_SECONDS = 0.05
+# Максимум записей в одной транзакции фоновой записи
+GROUP_COMMIT_MAX_BATCH = 500
+# Число повторов записи при блокировке базы
+RESULT_WRITE_RETRIES = 5
+# Отметка в заголовке базы (PRAGMA application_id): программа закрыла базу, перенеся журнал WAL в файл
+CLEAN_CLOSE_MARK = 0x51555A43
+# По скольким первым результатам файла старой версии (без uid) различаются места учеников при слиянии
+MERGE_SEAT_KEY_ROWS = 16
+# Размер буфера записи при экспорте вопросов
+EXPORT_BUFFER_SIZE = 1 << 20
+# Как часто (в записях) сообщать о прогрессе импорта и экспорта и проверять отмену
+PROGRESS_EVERY_ROWS = 1000
+# Наибольшее число процессов разбора файлов при синхронизации папки с вопросами
+SYNC_MAX_WORKERS = 4
+# Название выбора "без теста" (весь банк вопросов с настройками из окна администратора)
+ALL_QUESTIONS_TITLE = "Все вопросы"
+# Сколько экранов держать готовыми к повторному показу (давно не открывавшиеся удаляются)
+SCREEN_CACHE_SIZE = 3
+# Сколько мест показывает рейтинг класса
+LEADERBOARD_SIZE = 20
+# Как часто рейтинг класса проверяет, появились ли новые результаты
+LEADERBOARD_POLL_MS = 2000
+# Задержка перед поиском после последнего нажатия клавиши
+SEARCH_DEBOUNCE_MS = 250
+# Порт сервера класса по умолчанию
+DEFAULT_SERVER_PORT = 8765
+# Таймаут запросов к серверу класса
+SERVER_TIMEOUT_SECONDS = 10
+# Разделитель нескольких правильных ответов в поле correct_answer
+ANSWER_SEPARATOR = "|"
+# Сколько скомпилированных шаблонов вопросов держать в памяти
+TEMPLATE_CACHE_SIZE = 256
+# Наибольшая длина выражения в шаблоне вопроса
+TEMPLATE_EXPRESSION_MAX_LENGTH = 200
+# Наибольший размер целого результата (в битах) умножения и степени в выражениях шаблонов
+TEMPLATE_MAX_BITS = 256
+# До скольких знаков после запятой округляются дробные значения шаблонов
+TEMPLATE_DECIMALS = 2
+# Опечатки не допускаются в ответах короче этой длины
+MIN_TYPO_ANSWER_LENGTH = 4
+
+
+# Вывод этапов запуска: флаг --startup-trace или переменная окружения QUIZ_STARTUP_TRACE=1
+STARTUP_TRACE = "--startup-trace" in sys.argv or os.environ.get("QUIZ_STARTUP_TRACE") == "1"
+startup_phases = []
+
+
+def startup_phase(name):
+    """Отметка этапа запуска: время от старта программы, в миллисекундах."""
+    elapsed = (time.perf_counter() - STARTUP_STARTED) * 1000
+    startup_phases.append((name, elapsed))
+    if STARTUP_TRACE:
+        print(f"[запуск] {name}: {elapsed:.1f} мс", file=sys.stderr)
+
+
+startup_phase("импорт модулей")
+
+# Замеры длительности операций: флаг --metrics или переменная окружения QUIZ_METRICS=1;
+# --metrics-file ПУТЬ (или QUIZ_METRICS_FILE) дополнительно пишет замеры в журнал JSONL
+METRICS_FILE = (sys.argv[sys.argv.index("--metrics-file") + 1] if "--metrics-file" in sys.argv[:-1]
+                else os.environ.get("QUIZ_METRICS_FILE"))
+METRICS_ENABLED = "--metrics" in sys.argv or os.environ.get("QUIZ_METRICS") == "1" or bool(METRICS_FILE)
+# Интервалы гистограммы: от 1 мкс, каждый следующий вдвое шире (до ~35 минут)
+METRICS_MIN_SECONDS = 1e-6
+METRICS_BUCKETS = 32
+# Журнал замеров: размер файла до ротации, число старых файлов, замеров в буфере до записи
+METRICS_FILE_MAX_BYTES = 5 * 1024 * 1024
+METRICS_FILE_BACKUPS = 3
+METRICS_FLUSH_EVERY = 256
+
+
+class Metrics:
+    """Гистограммы длительности операций в памяти (ограниченного размера) и необязательный журнал JSONL.
+
+    Пока замеры не включены (enable_metrics), методы классов не обёрнуты и накладных расходов нет.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.file_path = None
+        self.histograms = {}  # Имя операции -> [число, сумма, максимум, интервалы...]
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """Учёт одного замера."""
+        bucket = min(METRICS_BUCKETS - 1, max(0, math.frexp(seconds / METRICS_MIN_SECONDS)[1]))
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = [0, 0.0, 0.0] + [0] * METRICS_BUCKETS
+            histogram[0] += 1
+            histogram[1] += seconds
+            histogram[2] = max(histogram[2], seconds)
+            histogram[3 + bucket] += 1
+            if self.file_path is not None:
+                self.pending.append((time.time(), name, seconds))
+                if len(self.pending) >= METRICS_FLUSH_EVERY:
+                    self.flush_locked()
+
+    @staticmethod
+    def percentile(histogram, fraction):
+        """Оценка перцентиля по интервалам гистограммы (верхняя граница интервала, не больше максимума)."""
+        rank = fraction * histogram[0]
+        seen = 0
+        for bucket, count in enumerate(histogram[3:]):
+            seen += count
+            if count and seen >= rank:
+                return min(histogram[2], METRICS_MIN_SECONDS * 2 ** bucket)
+        return histogram[2]
+
+    def summary(self):
+        """Сводка: (операция, число, среднее, p50, p95, максимум) в секундах, самые долгие по сумме сверху."""
+        with self.lock:
+            histograms = {name: list(histogram) for name, histogram in self.histograms.items()}
+        rows = [(name, histogram[0], histogram[1] / histogram[0], self.percentile(histogram, 0.5),
+                 self.percentile(histogram, 0.95), histogram[2]) for name, histogram in histograms.items()]
+        return sorted(rows, key=lambda row: row[1] * row[2], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def flush(self):
+        """Запись накопленных замеров в журнал."""
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if not self.pending or self.file_path is None:
+            return
+        try:
+            if os.path.exists(self.file_path) and os.path.getsize(self.file_path) >= METRICS_FILE_MAX_BYTES:
+                for number in range(METRICS_FILE_BACKUPS - 1, 0, -1):
+                    if os.path.exists(f"{self.file_path}.{number}"):
+                        os.replace(f"{self.file_path}.{number}", f"{self.file_path}.{number + 1}")
+                os.replace(self.file_path, f"{self.file_path}.1")
+            with open(self.file_path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps({"time": moment, "operation": name, "ms": round(seconds * 1000, 3)},
+                                           ensure_ascii=False) + "\n" for moment, name, seconds in self.pending)
+        except OSError as e:
+            print(f"Ошибка: не удалось записать замеры: {str(e)}", file=sys.stderr)
+        self.pending.clear()
+
+
+metrics = Metrics()
+
+
+def timed_method(name, method):
+    """Обёртка метода с замером длительности; лишние аргументы сигналов Qt (checked) отбрасываются."""
+    import inspect
+    code = method.__code__
+    accepts_varargs = code.co_flags & inspect.CO_VARARGS
+    arg_count = code.co_argcount
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not accepts_varargs and len(args) > arg_count:
+            args = args[:arg_count]
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.record(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def instrument(cls, names=None):
+    """Замена методов класса (по умолчанию всех открытых) обёртками с замером длительности."""
+    import inspect
+    for name in names or [name for name, value in vars(cls).items()
+                          if inspect.isfunction(value) and not name.startswith("_")]:
+        method = vars(cls)[name]
+        if not hasattr(method, "__wrapped__"):
+            setattr(cls, name, timed_method(f"{cls.__name__}.{name}", method))
+
+
+def report_error(message):
+    """Сообщение об ошибке: диалог в графическом режиме, stderr без него (сервер, фоновые потоки)."""
+    if isinstance(QApplication.instance(), QApplication) and threading.current_thread() is threading.main_thread():
+        QMessageBox.critical(None, "Ошибка", message)
+    else:
+        print(f"Ошибка: {message}", file=sys.stderr)
+
+
+def detect_encoding(filename):
+    """Определение кодировки текстового файла по BOM (по умолчанию UTF-8)."""
+    with open(filename, 'rb') as file:
+        head = file.read(4)
+    if head.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        return 'utf-32'
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    return 'utf-8'
+
+
+def parse_question_line(line):
+    """Разбор строки вида 'вопрос;ответ'. Возвращает (вопрос, ответ, ()) или текст ошибки."""
+    parts = line.split(';')
+    if len(parts) != 2:
+        return None, f"ожидалось 2 поля через ';', получено {len(parts)}"
+    return check_row(parts[0], parts[1])
+
+
+def is_network_path(path):
+    """Проверка, лежит ли файл в сетевой папке (WAL там не поддерживается)."""
+    path = os.path.abspath(path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4  # DRIVE_REMOTE
+    return False
+
+
+class ConnectionManager:
+    """Единое соединение SQLite для баз вопросов и результатов.
+
+    База вопросов открывается как main, остальные файлы подключаются через ATTACH к той же сессии.
+    Подготовленные выражения кэшируются соединением (cached_statements), записи выполняются
+    внутри transaction().
+    """
+
+    instances = {}
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                                          cached_statements=STATEMENT_CACHE_SIZE, uri=True)
+        self.connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_SECONDS * 1000}")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA temp_store = MEMORY")
+        self.connection.create_function("question_hash", 1, question_hash, deterministic=True)
+        self.attached = {}  # Абсолютный путь файла -> имя схемы
+        self.savepoint_depth = 0
+        self.unmarked_schemas = set()  # Схемы, с которых ещё не снята отметка CLEAN_CLOSE_MARK
+        self.configure_schema("main", db_path)
+
+    @classmethod
+    def for_path(cls, db_path):
+        """Общий менеджер соединения с базой db_path (свой для каждого потока, как требует sqlite3)."""
+        key = (os.path.abspath(db_path), threading.get_ident())
+        if key not in cls.instances:
+            cls.instances[key] = cls(db_path)
+        return cls.instances[key]
+
+    def configure_schema(self, schema, db_path):
+        """Журнал WAL и synchronous=NORMAL; для сетевых папок - обычный журнал."""
+        if is_network_path(db_path):
+            self.connection.execute(f"PRAGMA {schema}.journal_mode = DELETE")
+            self.connection.execute(f"PRAGMA {schema}.synchronous = FULL")
+        else:
+            self.connection.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            self.connection.execute(f"PRAGMA {schema}.synchronous = NORMAL")
+        self.unmarked_schemas.add(schema)
+
+    def attach(self, db_path, schema):
+        """Подключение файла базы к сессии. Возвращает имя схемы, под которым он доступен."""
+        key = os.path.abspath(db_path)
+        if key == os.path.abspath(self.db_path):
+            return "main"
+        if key not in self.attached:
+            name, suffix = schema, 1
+            while name in self.attached.values():
+                suffix += 1
+                name = f"{schema}{suffix}"
+            self.connection.execute("ATTACH DATABASE ? AS " + name, (db_path,))
+            self.configure_schema(name, db_path)
+            self.attached[key] = name
+        return self.attached[key]
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция: commit при успехе, rollback при исключении; вложенные - через SAVEPOINT."""
+        if self.connection.in_transaction:
+            self.savepoint_depth += 1
+            name = f"sp{self.savepoint_depth}"
+            self.connection.execute(f"SAVEPOINT {name}")
+            try:
+                yield self.connection
+                self.connection.execute(f"RELEASE {name}")
+            except BaseException:
+                self.connection.execute(f"ROLLBACK TO {name}")
+                self.connection.execute(f"RELEASE {name}")
+                raise
+            finally:
+                self.savepoint_depth -= 1
+        else:
+            for schema in list(self.unmarked_schemas):
+                clear_clean_close_mark(self.connection, schema)
+                self.unmarked_schemas.discard(schema)
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def migrate(self, schema, migrations):
+        """Обновление схемы schema до последней версии по списку шагов migrations.
+
+        Номер версии хранится в PRAGMA user_version: шаг migrations[i] переводит базу из версии i в
+        i + 1. Недостающие шаги выполняются одной транзакцией вместе с записью нового номера, поэтому
+        база не остаётся обновлённой наполовину; если база уже последней версии, запуск стоит одного
+        чтения PRAGMA. Базу более новой версии (от более новой программы) шаги не трогают.
+        Возвращает версию базы.
+        """
+        version = self.connection.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+        if version >= len(migrations):
+            return version
+        with self.transaction():
+            # Пока ждали блокировку записи, базу мог обновить другой процесс
+            version = self.connection.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+            for step in migrations[version:]:
+                step()
+            self.connection.execute(f"PRAGMA {schema}.user_version = {max(version, len(migrations))}")
+        return max(version, len(migrations))
+
+    def checkpoint(self):
+        """Перенос журналов WAL в файлы баз (main и подключённых), чтобы скопированный файл был полным."""
+        for schema in ["main", *self.attached.values()]:
+            self.connection.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)")
+
+    def close(self, checkpoint=False):
+        """Закрытие соединения; базы остаются в режиме WAL.
+
+        checkpoint=True - последнее закрытие при выходе из программы (close_all): журналы WAL
+        переносятся в файлы баз, и в заголовке ставится отметка CLEAN_CLOSE_MARK, по которой при
+        слиянии результатов файл без -wal отличают от скопированного во время работы программы.
+        """
+        for key in [key for key, manager in self.instances.items() if manager is self]:
+            del self.instances[key]
+        if checkpoint:
+            try:
+                self.connection.execute("PRAGMA busy_timeout = 0")  # Занятую другим процессом базу не ждём
+                for schema in ["main", *self.attached.values()]:
+                    if self.connection.execute(f"PRAGMA {schema}.application_id").fetchone()[0] != CLEAN_CLOSE_MARK:
+                        self.connection.execute(f"PRAGMA {schema}.application_id = {CLEAN_CLOSE_MARK}")
+                self.checkpoint()
+            except sqlite3.Error:
+                pass  # База занята другим процессом: журнал перенесёт последнее закрытое соединение
+        self.connection.close()
+
+    @classmethod
+    def close_all(cls):
+        """Закрытие общих соединений текущего потока с переносом журналов WAL - при выходе из программы.
+
+        Соединения фоновых потоков закрывают сами потоки (close() без переноса журналов).
+        """
+        thread_id = threading.get_ident()
+        for key, manager in list(cls.instances.items()):
+            if key[1] == thread_id:
+                manager.close(checkpoint=True)
+
+
+def clear_clean_close_mark(connection, schema):
+    """Снятие отметки CLEAN_CLOSE_MARK с базы schema перед первой записью сеанса (вне транзакции).
+
+    Снятая отметка сразу переносится в файл базы: данные, которые дальше будут лежать в журнале
+    WAL, не должны оказаться в копии файла, помеченной как закрытая полностью.
+    """
+    if connection.execute(f"PRAGMA {schema}.application_id").fetchone()[0] == CLEAN_CLOSE_MARK:
+        connection.execute(f"PRAGMA {schema}.application_id = 0")
+        connection.execute(f"PRAGMA {schema}.wal_checkpoint(PASSIVE)")
+
+
+class QuestionCache:
+    """Общий для процесса кэш чтений из базы вопросов с вытеснением давно не используемых записей.
+
+    Перед каждым обращением кэш сверяется с базой через соединение вызывающего потока:
+    connection.total_changes меняется от его собственных записей, PRAGMA data_version - от
+    записей любого другого соединения, в том числе из других процессов. Если с прошлой сверки
+    через это соединение что-то изменилось, кэш очищается и начинается новое поколение (одно на
+    процесс); первая сверка нового соединения только запоминает его версию. Внутри открытой
+    транзакции кэш не используется, чтобы незафиксированные данные не попали к другим потокам.
+    """
+
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, capacity=QUESTION_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.versions = weakref.WeakKeyDictionary()  # ConnectionManager -> версия базы при последней сверке
+        self.generation = 0  # Растёт при каждой очистке кэша
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_path(cls, db_path):
+        """Кэш базы db_path, общий для всех потоков процесса."""
+        key = os.path.abspath(db_path)
+        with cls.instances_lock:
+            if key not in cls.instances:
+                cls.instances[key] = cls()
+            return cls.instances[key]
+
+    def validate(self, manager):
+        """Сверка с базой под self.lock. Возвращает поколение кэша или None, если кэшем сейчас пользоваться нельзя."""
+        connection = manager.connection
+        if connection.in_transaction:
+            return None
+        version = (connection.total_changes, connection.execute("PRAGMA main.data_version").fetchone()[0])
+        previous = self.versions.get(manager)
+        self.versions[manager] = version
+        if previous is not None and previous != version:
+            self.entries.clear()
+            self.generation += 1
+        return self.generation
+
+    def get(self, manager, key, loader):
+        """Значение по ключу из кэша или из loader() (с сохранением в кэш, если база не менялась во время чтения)."""
+        with self.lock:
+            generation = self.validate(manager)
+            if generation is not None and key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        value = loader()
+        with self.lock:
+            self.misses += 1
+            if generation is not None and self.validate(manager) == generation:
+                self.entries[key] = value
+                if len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+
+def fts_normalize_sql(column):
+    """SQL-выражение текста для полнотекстового индекса: ё -> е (регистр учитывает токенизатор)."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fts_query(text):
+    """Запрос FTS5 из строки поиска: все слова должны встречаться, последнее - как префикс."""
+    words = text.replace("ё", "е").replace("Ё", "Е").split()
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def question_hash(question):
+    """Хеш нормализованного текста вопроса (регистр, пробелы, ё -> е) для поиска дубликатов."""
+    key = " ".join(question.casefold().replace("ё", "е").split())
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+class TransferCancelled(Exception):
+    """Импорт или экспорт вопросов отменён пользователем."""
+
+
+def check_row(question, correct_answer, tests=()):
+    """Проверка вопроса и ответа из файла. Возвращает (вопрос, ответ, названия тестов) или текст ошибки."""
+    question, correct_answer = str(question).strip(), str(correct_answer).strip()
+    if not question or not correct_answer:
+        return None, "пустой вопрос или ответ"
+    if isinstance(tests, str) or not all(isinstance(name, str) for name in tests):
+        return None, "тесты должны быть списком названий"
+    error = check_template(question, correct_answer)
+    if error:
+        return None, f"ошибка в шаблоне: {error}"
+    # Пробелы в названиях нормализуются: перевод строки разделяет названия в CSV и двоичном формате
+    tests = tuple(dict.fromkeys(" ".join(name.split()) for name in tests if name.strip()))
+    return (question, correct_answer, tests), None
+
+
+class TxtQuestionFormat:
+    """Текстовый формат 'вопрос;ответ' по строке на вопрос (без ; и переводов строк в тексте)."""
+
+    extension = ".txt"
+    title = "Text Files"
+    newline = None
+
+    def open_for_write(self, filename):
+        return open(filename, 'w', encoding='utf-8', newline=self.newline, buffering=EXPORT_BUFFER_SIZE)
+
+    def open_for_read(self, filename):
+        return open(filename, 'r', encoding=detect_encoding(filename), newline=self.newline)
+
+    def position(self, file):
+        """Прочитано байт файла (для прогресса)."""
+        return file.buffer.tell()
+
+    def write_header(self, file):
+        pass
+
+    def write_row(self, file, row):
+        """Запись вопроса. Возвращает причину, если вопрос в этом формате не записать (тогда он пропускается)."""
+        if any(symbol in text for text in row[1:3] for symbol in ";\r\n"):
+            return "в тексте есть ';' или перевод строки (сохраните в CSV или JSON Lines)"
+        file.write(f"{row[1]};{row[2]}\n")
+        return None
+
+    def read_rows(self, file):
+        """Записи файла: (номер, исходный текст, (вопрос, ответ, тесты) или None, ошибка или None)."""
+        for line_number, line in enumerate(file, start=1):
+            line = line.rstrip('\r\n')
+            if line.strip():  # Пустые строки пропускаем
+                yield (line_number, line) + parse_question_line(line)
+
+
+class JsonlQuestionFormat(TxtQuestionFormat):
+    """JSON Lines: объект на строку с id, текстом вопроса, списком правильных ответов и тестов."""
+
+    extension = ".jsonl"
+    title = "JSON Lines"
+
+    def write_row(self, file, row):
+        answers = [answer.strip() for answer in row[2].split(ANSWER_SEPARATOR)]
+        item = {"id": row[0], "question": row[1], "answers": answers}
+        if row[3]:
+            item["tests"] = list(row[3])
+        file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        return None
+
+    def read_rows(self, file):
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                answers = item.get("answers")
+                correct_answer = ANSWER_SEPARATOR.join(answers) if answers else item.get("correct_answer", "")
+                yield (line_number, line.rstrip('\r\n')) + check_row(item["question"], correct_answer,
+                                                                     item.get("tests", ()))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                yield line_number, line.rstrip('\r\n'), None, f"неверная запись JSON: {str(e)}"
+
+
+class CsvQuestionFormat(TxtQuestionFormat):
+    """CSV с заголовком id,question,correct_answer,tests; кавычки позволяют ; и переводы строк в тексте.
+
+    В столбце tests - названия тестов вопроса по одному в строке; столбцов id и tests может не быть.
+    """
+
+    extension = ".csv"
+    title = "CSV"
+    newline = ''
+    header = ["id", "question", "correct_answer", "tests"]
+
+    def write_header(self, file):
+        self.writer = csv.writer(file)
+        self.writer.writerow(self.header)
+
+    def write_row(self, file, row):
+        self.writer.writerow(row[:3] + ("\n".join(row[3]),))
+        return None
+
+    def read_rows(self, file):
+        reader = csv.reader(file)
+        for record in reader:
+            if not record or record in (self.header, self.header[:3]):
+                continue
+            if len(record) == 2:
+                record = [""] + record  # Файл без столбца id
+            if len(record) == 3:
+                record = record + [""]  # Файл без столбца tests
+            if len(record) != 4:
+                yield reader.line_num, ",".join(record), None, f"ожидалось 4 столбца, получено {len(record)}"
+                continue
+            yield (reader.line_num, ",".join(record)) + check_row(record[1], record[2], record[3].splitlines())
+
+
+class BinaryQuestionFormat:
+    """Компактный двоичный формат: заголовок и записи (id, длины вопроса, ответа и тестов, UTF-8 тексты).
+
+    Названия тестов записи разделены переводом строки. Файлы первой версии (без тестов) читаются.
+    """
+
+    extension = ".qbin"
+    title = "Двоичный пакет вопросов"
+    magic = b"QBIN2\n"
+    record = struct.Struct("<qIII")
+    legacy_magic = b"QBIN1\n"
+    legacy_record = struct.Struct("<qII")
+
+    def open_for_write(self, filename):
+        return open(filename, 'wb', buffering=EXPORT_BUFFER_SIZE)
+
+    def open_for_read(self, filename):
+        return open(filename, 'rb')
+
+    def position(self, file):
+        return file.tell()
+
+    def write_header(self, file):
+        file.write(self.magic)
+
+    def write_row(self, file, row):
+        question, correct_answer = row[1].encode("utf-8"), row[2].encode("utf-8")
+        tests = "\n".join(row[3]).encode("utf-8")
+        file.write(self.record.pack(row[0], len(question), len(correct_answer), len(tests))
+                   + question + correct_answer + tests)
+        return None
+
+    def read_rows(self, file):
+        magic = file.read(len(self.magic))
+        if magic not in (self.magic, self.legacy_magic):
+            raise ValueError("файл не является двоичным пакетом вопросов")
+        record = self.record if magic == self.magic else self.legacy_record
+        number = 0
+        while True:
+            head = file.read(record.size)
+            if not head:
+                break
+            number += 1
+            if len(head) < record.size:
+                raise ValueError(f"файл обрезан на записи {number}")
+            _, question_size, answer_size, *tests_size = record.unpack(head)
+            size = question_size + answer_size + sum(tests_size)
+            data = file.read(size)
+            if len(data) < size:
+                raise ValueError(f"файл обрезан на записи {number}")
+            question = data[:question_size].decode("utf-8")
+            correct_answer = data[question_size:question_size + answer_size].decode("utf-8")
+            tests = data[question_size + answer_size:].decode("utf-8")
+            yield (number, question) + check_row(question, correct_answer, tests.split("\n") if tests else ())
+
+
+# Форматы файлов вопросов по расширению; новый формат достаточно добавить сюда
+QUESTION_FORMATS = {fmt.extension: fmt for fmt in (
+    TxtQuestionFormat, JsonlQuestionFormat, CsvQuestionFormat, BinaryQuestionFormat
+)}
+
+
+def question_format_for(filename):
+    """Формат файла вопросов по расширению (по умолчанию - текстовый)."""
+    return QUESTION_FORMATS.get(os.path.splitext(filename)[1].lower(), TxtQuestionFormat)()
+
+
+def question_file_filter():
+    """Фильтр для QFileDialog со всеми поддерживаемыми форматами."""
+    return ";;".join(f"{fmt.title} (*{fmt.extension})" for fmt in QUESTION_FORMATS.values())
+
+
+def read_question_file(path, known_hash=None):
+    """Хеширование и разбор одного файла папки синхронизации (выполняется в процессе пула).
+
+    Возвращает (путь, размер, время изменения в нс, хеш содержимого, записи (вопрос, ответ, тесты, хеш вопроса),
+    отклонённые записи). Если содержимое не изменилось (хеш равен known_hash), записи равны None.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(EXPORT_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+    if content_hash == known_hash:
+        return path, stat.st_size, stat.st_mtime_ns, content_hash, None, []
+    fmt = question_format_for(path)
+    rows = []
+    rejected = []
+    with fmt.open_for_read(path) as file:
+        for number, source, row, error in fmt.read_rows(file):
+            if error:
+                rejected.append((number, source, error))
+            else:
+                rows.append(row + (question_hash(row[0]),))
+    return path, stat.st_size, stat.st_mtime_ns, content_hash, rows, rejected
+
+
+# Число в ответе: целое или десятичная дробь с точкой (без показателя степени)
+NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)")
+
+
+def parse_number(text):
+    """Точное значение числа ("4", "4.0", "4,5"): int или Decimal; None, если text не число.
+
+    Запятая - десятичный разделитель, только если она единственный разделитель в записи. Запись
+    вида "1,000" (одна-три цифры, запятая, три цифры) может означать тысячу, поэтому числом не считается
+    и сравнивается как текст.
+    """
+    if "," in text:
+        whole, _, fraction = text.partition(",")
+        digits = whole.lstrip("+-")
+        if "." in text or "," in fraction or (len(fraction) == 3 and 0 < len(digits) <= 3 and digits != "0"):
+            return None
+        text = f"{whole}.{fraction}"
+    if NUMBER_PATTERN.fullmatch(text) is None:
+        return None
+    if "." not in text:
+        return int(text)
+    import decimal
+    return decimal.Decimal(text)
+
+
+def normalize_answer(text):
+    """Приведение ответа к ключу сравнения: регистр, пробелы, ё -> е, числа (без потери точности)."""
+    key = " ".join(text.casefold().replace("ё", "е").split())
+    number = parse_number(key)
+    if number is None:
+        return key
+    if not isinstance(number, int):
+        if number != number.to_integral_value():
+            return format(number.normalize(), "f")  # "4.50" -> "4.5"
+        number = int(number)
+    return str(number)
+
+
+def answer_keys_for(correct_answer):
+    """Множество нормализованных ключей всех правильных ответов вопроса."""
+    keys = {normalize_answer(answer) for answer in correct_answer.split(ANSWER_SEPARATOR)}
+    keys.discard("")
+    return keys
+
+
+def within_edit_distance(first, second, max_distance):
+    """Проверка, что расстояние Левенштейна не больше max_distance (с досрочным выходом)."""
+    if abs(len(first) - len(second)) > max_distance:
+        return False
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current = [i]
+        for j, second_char in enumerate(second, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (first_char != second_char)))
+        if min(current) > max_distance:
+            return False  # Дальше расстояние только растёт
+        previous = current
+    return previous[-1] <= max_distance
+
+
+def is_answer_correct(answer, answer_keys, typo_tolerance=0):
+    """Проверка ответа по множеству ключей; опечатки допускаются только в нечисловых ответах."""
+    key = normalize_answer(answer)
+    if key in answer_keys:
+        return True
+    if not typo_tolerance or len(key) < MIN_TYPO_ANSWER_LENGTH or parse_number(key) is not None:
+        return False
+    return any(within_edit_distance(key, correct_key, typo_tolerance) for correct_key in answer_keys
+               if len(correct_key) >= MIN_TYPO_ANSWER_LENGTH and parse_number(correct_key) is None)
+
+
+class TemplateError(ValueError):
+    """Ошибка в шаблоне вопроса (текст для учителя)."""
+
+
+def bounded_power(base, exponent):
+    """Степень с оценкой размера результата до вычисления (защита от огромных чисел)."""
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1 \
+            and exponent * (base.bit_length() - 1) > TEMPLATE_MAX_BITS:
+        raise TemplateError("слишком большое число в выражении")
+    return base ** exponent
+
+
+def bounded_multiply(left, right):
+    """Произведение с оценкой размера результата до вычисления."""
+    if isinstance(left, int) and isinstance(right, int) \
+            and left.bit_length() + right.bit_length() > TEMPLATE_MAX_BITS:
+        raise TemplateError("слишком большое число в выражении")
+    return left * right
+
+
+def bounded_round(value, digits=None):
+    """round с ограничением числа знаков (round(x, -n) для целых вычисляет 10 ** n)."""
+    if isinstance(digits, int) and abs(digits) > TEMPLATE_MAX_BITS:
+        raise TemplateError("слишком большое число знаков округления")
+    return round(value, digits)
+
+
+# Что допускается в выражениях шаблонов (операторы - по именам классов узлов ast)
+TEMPLATE_OPERATORS = {
+    "Add": operator.add, "Sub": operator.sub, "Mult": bounded_multiply, "Div": operator.truediv,
+    "FloorDiv": operator.floordiv, "Mod": operator.mod, "Pow": bounded_power,
+}
+TEMPLATE_FUNCTIONS = {"abs": abs, "min": min, "max": max, "round": bounded_round}
+# Подстановка в тексте шаблона: {выражение}; {{ и }} - сами фигурные скобки
+TEMPLATE_PLACEHOLDER = re.compile(r"\{\{|\}\}|\{([^{}]*)\}")
+# Параметр шаблона: {имя:от..до} или {имя:от..до:шаг}
+TEMPLATE_PARAMETER = re.compile(r"\s*([^\W\d]\w*)\s*:(.+?)\.\.([^:]+)(?::(.+))?")
+
+
+def compile_expression(text, names):
+    """Компиляция выражения шаблона в функцию от словаря значений параметров.
+
+    Выражение разбирается модулем ast один раз и превращается в цепочку замыканий. Допускаются
+    только числа, параметры из names, арифметика и функции TEMPLATE_FUNCTIONS, поэтому выражение
+    из файла вопросов не может выполнить произвольный код.
+    """
+    import ast
+    text = text.strip()
+    if len(text) > TEMPLATE_EXPRESSION_MAX_LENGTH:
+        raise TemplateError("слишком длинное выражение")
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError:
+        raise TemplateError(f"ошибка в выражении '{text}'") from None
+    return compile_node(tree.body, names, text)
+
+
+def compile_node(node, names, text):
+    """Замыкание для одного узла выражения шаблона (см. compile_expression)."""
+    import ast
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda values: value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise TemplateError(f"неизвестный параметр '{node.id}'")
+        return operator.itemgetter(node.id)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = compile_node(node.operand, names, text)
+        return (lambda values: -operand(values)) if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp) and type(node.op).__name__ in TEMPLATE_OPERATORS:
+        function = TEMPLATE_OPERATORS[type(node.op).__name__]
+        left, right = compile_node(node.left, names, text), compile_node(node.right, names, text)
+        return lambda values: function(left(values), right(values))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in TEMPLATE_FUNCTIONS \
+            and not node.keywords:
+        function = TEMPLATE_FUNCTIONS[node.func.id]
+        arguments = [compile_node(argument, names, text) for argument in node.args]
+        return lambda values: function(*(argument(values) for argument in arguments))
+    raise TemplateError(f"недопустимое выражение '{text}'")
+
+
+def format_template_value(value):
+    """Значение для текста вопроса и ответа: целые без дробной части, дробные - с округлением."""
+    if isinstance(value, float):
+        value = round(value, TEMPLATE_DECIMALS)
+        if value.is_integer():
+            value = int(value)
+    return str(value)
+
+
+def template_integer(value, name):
+    """Граница или шаг диапазона параметра (должны быть целыми)."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if not isinstance(value, int):
+        raise TemplateError(f"диапазон параметра '{name}' должен быть целым")
+    return value
+
+
+class QuestionTemplate:
+    """Вопрос-шаблон: из него для каждой попытки строится свой вариант.
+
+    Текст содержит параметры {имя:от..до} или {имя:от..до:шаг} и подстановки {выражение},
+    правильный ответ - выражение после '=' (несколько ответов - через ANSWER_SEPARATOR), например
+    "{a:10..99} - {b:1..a}" с ответом "=a - b". Границы диапазона могут зависеть от параметров,
+    заданных левее. Выражения компилируются один раз при создании шаблона.
+    """
+
+    def __init__(self, question, correct_answer):
+        self.parameters = []  # (имя, от, до, шаг или None) - скомпилированные выражения
+        names = []
+        parts = []  # Текст или (выражение,)
+        position = 0
+        for match in TEMPLATE_PLACEHOLDER.finditer(question):
+            parts.append(question[position:match.start()])
+            position = match.end()
+            if match.group(1) is None:
+                parts.append(match.group(0)[0])  # {{ или }}
+                continue
+            definition = TEMPLATE_PARAMETER.fullmatch(match.group(1))
+            if definition is None:
+                parts.append((match.group(1),))
+                continue
+            name = definition.group(1)
+            if name in names:
+                raise TemplateError(f"параметр '{name}' задан дважды")
+            bounds = [compile_expression(text, names) if text else None for text in definition.group(2, 3, 4)]
+            self.parameters.append((name, *bounds))
+            names.append(name)
+            parts.append((name,))
+        parts.append(question[position:])
+        self.parts = [part if isinstance(part, str) else compile_expression(part[0], names) for part in parts]
+        self.answers = [compile_expression(answer, names) for answer in correct_answer[1:].split(ANSWER_SEPARATOR)]
+
+    def instantiate(self, seed, question_id):
+        """Вариант вопроса для попытки: (текст, правильный ответ).
+
+        Значения параметров выбирает генератор с зерном (seed, question_id), поэтому по зерну
+        попытки из журнала вариант и оценка ответа воспроизводятся точно.
+        """
+        rng = random.Random(f"{seed}:{question_id}")
+        values = {}
+        try:
+            for name, low, high, step in self.parameters:
+                low, high = template_integer(low(values), name), template_integer(high(values), name)
+                step = template_integer(step(values), name) if step else 1
+                if step <= 0 or low > high:
+                    raise TemplateError(f"пустой диапазон параметра '{name}': {low}..{high}")
+                values[name] = rng.randrange(low, high + 1, step)
+            text = "".join(part if isinstance(part, str) else format_template_value(part(values))
+                           for part in self.parts)
+            answer = ANSWER_SEPARATOR.join(format_template_value(answer(values)) for answer in self.answers)
+        except TemplateError:
+            raise
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise TemplateError(f"ошибка вычисления: {str(e)}") from None
+        return text, answer
+
+
+def question_template(question, correct_answer):
+    """Скомпилированный шаблон вопроса или None для обычного вопроса.
+
+    Шаблон - вопрос с параметром {имя:от..до} и ответом, начинающимся с '='.
+    Ошибки в шаблоне передаются исключением TemplateError.
+    """
+    if not correct_answer.startswith("="):
+        return None  # Обычные вопросы не занимают кэш шаблонов
+    return compile_template(question, correct_answer)
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(question, correct_answer):
+    if not any(match.group(1) is not None and TEMPLATE_PARAMETER.fullmatch(match.group(1))
+               for match in TEMPLATE_PLACEHOLDER.finditer(question)):
+        return None
+    return QuestionTemplate(question, correct_answer)
+
+
+def check_template(question, correct_answer):
+    """Проверка шаблона вопроса: компиляция и пробный вариант. Возвращает текст ошибки или None."""
+    try:
+        template = question_template(question, correct_answer)
+        if template is not None:
+            template.instantiate(0, 0)
+    except TemplateError as e:
+        return str(e)
+    return None
 
 
 class Database:
     """Класс для управления базой данных вопросов и паролями."""
 
-    def __init__(self, db_name="quiz.db"):
+    def __init__(self, db_name="quiz.db", manager=None):
         # Создание папки 'db', если она не существует
         self.db_folder = "db"
         if not os.path.exists(self.db_folder):
             os.makedirs(self.db_folder)
 
         self.db_path = os.path.join(self.db_folder, db_name)
+        self.manager = manager
         self.connection = None
         self.cursor = None
+        self.cache = None
+        self._fts_enabled = None
         self.connect(self.db_path)
 
     def connect(self, db_name):
         """Соединение с базой данных для вопросов."""
         try:
-            self.connection = sqlite3.connect(db_name)
+            if self.manager is None:
+                self.manager = ConnectionManager.for_path(db_name)
+            self.connection = self.manager.connection
             self.cursor = self.connection.cursor()
-            self.create_tables()
-            self.create_password_table()
+            self.cache = QuestionCache.for_path(self.manager.db_path)
+            self.manager.migrate("main", self.migrations())
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось подключиться к базе данных: {str(e)}")
+            report_error(f"Не удалось подключиться к базе данных: {str(e)}")
             sys.exit(1)
 
+    def close(self):
+        """Закрытие курсора (общее соединение закрывает ConnectionManager.close_all)."""
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+
+    def migrations(self):
+        """Шаги схемы базы вопросов по порядку версий; новые шаги добавляются только в конец.
+
+        Первые шаги написаны через IF NOT EXISTS и проверки столбцов, поэтому базы, созданные до
+        появления версий (user_version = 0), обновляются ими на месте.
+        """
+        return [
+            self.create_tables,
+            self.create_answer_keys_table,
+            self.create_test_tables,
+            self.create_media_table,
+            self.create_sync_tables,
+            self.create_search_index,
+            self.create_password_table,
+            self.refresh_answer_keys,
+            self.drop_answer_key_triggers,
+        ]
+
     def create_tables(self):
         """Создание таблицы для вопросов, если она не существует."""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                correct_answer TEXT NOT NULL,
+                content_hash INTEGER
+            )
+        """)
+        self.cursor.execute("PRAGMA table_info(questions)")
+        if "content_hash" not in [column[1] for column in self.cursor.fetchall()]:
+            # База старой версии: хеши считаются один раз, дубликаты удаляются до создания индекса
+            self.cursor.execute("ALTER TABLE questions ADD COLUMN content_hash INTEGER")
+            self.remove_duplicate_questions()
+        self.cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS questions_content_hash ON questions (content_hash)")
+
+    def remove_duplicate_questions(self):
+        """Удаление дубликатов (остаётся самый ранний вопрос) одним запросом; без commit."""
+        self.cursor.execute("UPDATE questions SET content_hash = question_hash(question) WHERE content_hash IS NULL")
+        self.cursor.execute("DELETE FROM questions WHERE id NOT IN "
+                            "(SELECT MIN(id) FROM questions GROUP BY content_hash)")
+        return self.cursor.rowcount
+
+    def deduplicate_questions(self):
+        """Обслуживание: удаление повторяющихся вопросов из банка. Возвращает число удалённых."""
         try:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question TEXT NOT NULL,
-                    correct_answer TEXT NOT NULL
-                )
-            """)
-            self.connection.commit()
+            with self.manager.transaction():
+                return self.remove_duplicate_questions()
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось создать таблицы: {str(e)}")
-            sys.exit(1)
+            report_error(f"Не удалось удалить дубликаты: {str(e)}")
+            return 0
 
-    def create_password_table(self):
-        """Создание таблицы для паролей, если она не существует."""
+    def create_answer_keys_table(self):
+        """Создание таблицы нормализованных ключей ответов, если она не существует."""
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'answer_keys'")
+        exists = self.cursor.fetchone() is not None
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS answer_keys (
+                question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                answer_key TEXT NOT NULL,
+                PRIMARY KEY (question_id, answer_key)
+            ) WITHOUT ROWID
+        """)
+        if not exists:
+            self.store_answer_keys_since(0)  # Ключи для уже существующих вопросов
+
+    def refresh_answer_keys(self):
+        """Пересчёт всех ключей ответов: числа нормализуются точно (без float), "1,000" - не число."""
+        self.cursor.execute("DELETE FROM answer_keys")
+        self.store_answer_keys_since(0)
+
+    def drop_answer_key_triggers(self):
+        """Удаление триггеров пересчёта ключей ответов.
+
+        Триггеры вызывали функцию SQL, которая есть только в этой программе, и запись вопросов из
+        других программ (sqlite3, просмотрщики баз, старые версии на местах учеников) завершалась
+        ошибкой. Ключи ответов пересчитывают методы записи Database.
+        """
+        self.cursor.execute("DROP TRIGGER IF EXISTS questions_answer_keys_insert")
+        self.cursor.execute("DROP TRIGGER IF EXISTS questions_answer_keys_update")
+
+    def create_search_index(self):
+        """Полнотекстовый индекс FTS5 по вопросам и ответам, синхронизируемый триггерами."""
+        question, answer = fts_normalize_sql("question"), fts_normalize_sql("correct_answer")
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'")
+        if self.cursor.fetchone() is not None:
+            return
         try:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS passwords (
-                    id INTEGER PRIMARY KEY,
-                    password TEXT NOT NULL
-                )
-            """)
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute("""
+                    CREATE VIRTUAL TABLE questions_fts USING fts5(
+                        question, correct_answer, content='',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                    )
+                """)
+                self.cursor.execute(f"INSERT INTO questions_fts (rowid, question, correct_answer) "
+                                    f"SELECT id, {question}, {answer} FROM questions")
+                new_question, new_answer = fts_normalize_sql("new.question"), fts_normalize_sql("new.correct_answer")
+                old_question, old_answer = fts_normalize_sql("old.question"), fts_normalize_sql("old.correct_answer")
+                delete_old = (f"INSERT INTO questions_fts (questions_fts, rowid, question, correct_answer) "
+                              f"VALUES ('delete', old.id, {old_question}, {old_answer});")
+                insert_new = (f"INSERT INTO questions_fts (rowid, question, correct_answer) "
+                              f"VALUES (new.id, {new_question}, {new_answer});")
+                self.cursor.execute(f"CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN "
+                                    f"{insert_new} END")
+                self.cursor.execute(f"CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN "
+                                    f"{delete_old} END")
+                self.cursor.execute(f"CREATE TRIGGER questions_fts_update AFTER UPDATE ON questions BEGIN "
+                                    f"{delete_old} {insert_new} END")
+        except sqlite3.OperationalError as e:
+            if "fts5" not in str(e):
+                raise
+            # SQLite без FTS5: индекс не создаётся, поиск идёт через LIKE (см. fts_enabled)
+
+    @property
+    def fts_enabled(self):
+        """Есть ли в базе полнотекстовый индекс (проверяется при первом поиске)."""
+        if self._fts_enabled is None:
+            self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'")
+            self._fts_enabled = self.cursor.fetchone() is not None
+        return self._fts_enabled
+
+    def search_questions(self, text, limit, offset=0, test_id=None):
+        """Поиск вопросов (всех или теста) по тексту вопроса и ответа, лучшие совпадения первыми."""
+        in_test = "" if test_id is None else \
+            "AND EXISTS (SELECT 1 FROM test_questions WHERE test_id = ? AND question_id = q.id)"
+        test_params = () if test_id is None else (test_id,)
+        try:
+            if self.fts_enabled:
+                match = fts_query(text)
+                if not match:
+                    return []
+                self.cursor.execute(f"""
+                    SELECT q.id, q.question, q.correct_answer
+                    FROM questions_fts JOIN questions AS q ON q.id = questions_fts.rowid
+                    WHERE questions_fts MATCH ? {in_test} ORDER BY questions_fts.rank LIMIT ? OFFSET ?
+                """, (match,) + test_params + (limit, offset))
+            else:
+                pattern = f"%{text.strip()}%"
+                self.cursor.execute(f"SELECT id, question, correct_answer FROM questions AS q "
+                                    f"WHERE (question LIKE ? OR correct_answer LIKE ?) {in_test} "
+                                    f"ORDER BY id LIMIT ? OFFSET ?",
+                                    (pattern, pattern) + test_params + (limit, offset))
+            return self.cursor.fetchall()
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось создать таблицу паролей: {str(e)}")
-            sys.exit(1)
+            report_error(f"Не удалось выполнить поиск: {str(e)}")
+            return []
+
+    def store_answer_keys_since(self, last_id):
+        """Расчёт ключей ответов для вопросов с id больше last_id (без commit)."""
+        reader = self.connection.cursor()
+        try:
+            reader.execute("SELECT id, correct_answer FROM questions WHERE id > ? ORDER BY id", (last_id,))
+            while True:
+                rows = reader.fetchmany(IMPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                self.store_answer_keys(rows)
+        finally:
+            reader.close()
+
+    def store_answer_keys(self, rows, replace=False):
+        """Запись ключей ответов для пар (id вопроса, правильный ответ); replace=True - взамен прежних."""
+        if replace:
+            self.cursor.executemany("DELETE FROM answer_keys WHERE question_id = ?", [(row[0],) for row in rows])
+        self.cursor.executemany("INSERT OR IGNORE INTO answer_keys (question_id, answer_key) VALUES (?, ?)",
+                                [(question_id, key) for question_id, correct_answer in rows
+                                 for key in answer_keys_for(correct_answer)])
+
+    def get_answer_keys(self, question_id):
+        """Получение множества ключей правильных ответов вопроса (через общий кэш)."""
+        try:
+            return self.cache.get(self.manager, ("answer_keys", question_id), lambda: frozenset(
+                row[0] for row in self.cursor.execute(
+                    "SELECT answer_key FROM answer_keys WHERE question_id = ?", (question_id,)).fetchall()))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить ответы: {str(e)}")
+            return set()
+
+    def create_test_tables(self):
+        """Создание таблиц тестов и принадлежности вопросов тестам.
+
+        Первичный ключ (test_id, question_id) делает выборку вопросов одного теста поиском
+        диапазона по индексу; обратный индекс нужен для каскадного удаления вопросов.
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                duration INTEGER NOT NULL DEFAULT 60,  -- Время теста в секундах
+                question_count INTEGER NOT NULL DEFAULT 0  -- Вопросов в попытке (0 - все)
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS test_questions (
+                test_id INTEGER NOT NULL REFERENCES tests(id) ON DELETE CASCADE,
+                question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                PRIMARY KEY (test_id, question_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS test_questions_question ON test_questions (question_id, test_id)")
+
+    def get_tests(self):
+        """Список тестов: (id, название, время в секундах, число вопросов в попытке)."""
+        try:
+            self.cursor.execute("SELECT id, name, duration, question_count FROM tests ORDER BY name")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить тесты: {str(e)}")
+            return []
+
+    def add_test(self, name, duration=60, question_count=0):
+        """Создание теста (или поиск существующего с таким названием). Возвращает id теста."""
+        try:
+            with self.manager.transaction():
+                self.cursor.execute("INSERT INTO tests (name, duration, question_count) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (name) DO NOTHING", (name, duration, question_count))
+                self.cursor.execute("SELECT id FROM tests WHERE name = ?", (name,))
+                return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            report_error(f"Не удалось создать тест: {str(e)}")
+            return None
+
+    def update_test(self, test_id, duration=None, question_count=None):
+        """Изменение времени и (или) числа вопросов теста."""
+        try:
+            with self.manager.transaction():
+                self.cursor.execute("UPDATE tests SET duration = COALESCE(?, duration), "
+                                    "question_count = COALESCE(?, question_count) WHERE id = ?",
+                                    (duration, question_count, test_id))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось изменить тест: {str(e)}")
+
+    def delete_test(self, test_id):
+        """Удаление теста (сами вопросы остаются в банке)."""
+        try:
+            with self.manager.transaction():
+                self.cursor.execute("DELETE FROM tests WHERE id = ?", (test_id,))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось удалить тест: {str(e)}")
+
+    def add_questions_to_test(self, test_id, question_ids):
+        """Включение вопросов в тест (уже включённые пропускаются)."""
+        try:
+            with self.manager.transaction():
+                self.cursor.executemany("INSERT OR IGNORE INTO test_questions (test_id, question_id) VALUES (?, ?)",
+                                        [(test_id, question_id) for question_id in question_ids])
+        except sqlite3.Error as e:
+            report_error(f"Не удалось добавить вопросы в тест: {str(e)}")
+
+    def remove_questions_from_test(self, test_id, question_ids):
+        """Исключение вопросов из теста (из банка они не удаляются)."""
+        try:
+            with self.manager.transaction():
+                self.cursor.executemany("DELETE FROM test_questions WHERE test_id = ? AND question_id = ?",
+                                        [(test_id, question_id) for question_id in question_ids])
+        except sqlite3.Error as e:
+            report_error(f"Не удалось убрать вопросы из теста: {str(e)}")
+
+    def create_media_table(self):
+        """Создание таблицы изображений вопросов.
+
+        Изображения хранятся отдельно от текста, поэтому выборки вопросов их не читают. rowid строки
+        равен id вопроса, что позволяет открывать BLOB напрямую (blobopen) и читать его кусками.
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_media (
+                question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+                size INTEGER NOT NULL,
+                checksum INTEGER NOT NULL,  -- CRC32 данных: по нему сбрасываются кэши изображений
+                data BLOB NOT NULL
+            )
+        """)
+
+    def get_media_ids(self):
+        """Вопросы с изображениями: {id вопроса: контрольная сумма изображения} (через общий кэш)."""
+        try:
+            return dict(self.cache.get(self.manager, ("media",), lambda: tuple(self.cursor.execute(
+                "SELECT question_id, checksum FROM question_media").fetchall())))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить список изображений: {str(e)}")
+            return {}
+
+    def set_question_media(self, question_id, filename):
+        """Прикрепление изображения из файла к вопросу (прежнее заменяется); файл пишется в BLOB кусками."""
+        try:
+            size = os.path.getsize(filename)
+            checksum = 0
+            with self.manager.transaction(), open(filename, 'rb') as file:
+                self.cursor.execute("INSERT OR REPLACE INTO question_media (question_id, size, checksum, data) "
+                                    "VALUES (?, ?, 0, zeroblob(?))", (question_id, size, size))
+                if hasattr(self.connection, "blobopen"):
+                    with self.connection.blobopen("question_media", "data", question_id) as blob:
+                        for chunk in iter(lambda: file.read(MEDIA_CHUNK_SIZE), b""):
+                            blob.write(chunk)
+                            checksum = zlib.crc32(chunk, checksum)
+                else:  # Python < 3.11: без потоковой записи
+                    data = file.read()
+                    checksum = zlib.crc32(data)
+                    self.cursor.execute("UPDATE question_media SET data = ? WHERE question_id = ?", (data, question_id))
+                self.cursor.execute("UPDATE question_media SET checksum = ? WHERE question_id = ?",
+                                    (checksum, question_id))
+        except (OSError, sqlite3.Error) as e:
+            report_error(f"Не удалось сохранить изображение: {str(e)}")
+
+    def read_question_media(self, question_id):
+        """Данные изображения вопроса, прочитанные кусками (без одного большого SELECT), или None."""
+        try:
+            if hasattr(self.connection, "blobopen"):
+                with self.connection.blobopen("question_media", "data", question_id, readonly=True) as blob:
+                    return b"".join(iter(lambda: blob.read(MEDIA_CHUNK_SIZE), b""))
+            row = self.cursor.execute("SELECT size FROM question_media WHERE question_id = ?", (question_id,)).fetchone()
+            if row is None:
+                return None
+            return b"".join(self.cursor.execute(
+                "SELECT substr(data, ?, ?) FROM question_media WHERE question_id = ?",
+                (start + 1, MEDIA_CHUNK_SIZE, question_id)).fetchone()[0] for start in range(0, row[0], MEDIA_CHUNK_SIZE))
+        except sqlite3.OperationalError as e:
+            if "no such rowid" in str(e):
+                return None  # Изображение успели удалить
+            report_error(f"Не удалось прочитать изображение: {str(e)}")
+            return None
+        except sqlite3.Error as e:
+            report_error(f"Не удалось прочитать изображение: {str(e)}")
+            return None
+
+    def remove_question_media(self, question_id):
+        """Удаление изображения вопроса."""
+        try:
+            with self.manager.transaction():
+                self.cursor.execute("DELETE FROM question_media WHERE question_id = ?", (question_id,))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось удалить изображение: {str(e)}")
+
+    def create_sync_tables(self):
+        """Создание манифеста синхронизации папки с вопросами.
+
+        synced_files хранит размер, время изменения и хеш содержимого каждого файла папки, чтобы
+        при следующей синхронизации разбирать только новые и изменённые файлы. synced_questions
+        связывает файл с его вопросами; created отмечает вопросы, которые добавила в банк синхронизация
+        (только они удаляются, когда пропадают из всех файлов).
+        """
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS synced_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS synced_questions (
+                path TEXT NOT NULL REFERENCES synced_files(path) ON DELETE CASCADE,
+                question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                created INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (path, question_id)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS synced_questions_question ON synced_questions (question_id)")
+
+    def create_password_table(self):
+        """Создание таблицы для паролей, если она не существует."""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS passwords (
+                id INTEGER PRIMARY KEY,
+                password TEXT NOT NULL
+            )
+        """)
 
     def set_password(self, password):
         """Устанавливает пароль в базу данных."""
         try:
-            self.cursor.execute("DELETE FROM passwords")  # Удаляем существующие записи
-            self.cursor.execute("INSERT INTO passwords (password) VALUES (?)", (password,))
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute("DELETE FROM passwords")  # Удаляем существующие записи
+                self.cursor.execute("INSERT INTO passwords (password) VALUES (?)", (password,))
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось установить пароль: {str(e)}")
+            report_error(f"Не удалось установить пароль: {str(e)}")
 
     def get_password(self):
         """Получение пароля из базы данных."""
@@ -84,65 +1421,377 @@ class Database:
                 return None
             return result[0]  # Вернуть пароль, если он существует
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось получить пароль: {str(e)}")
+            report_error(f"Не удалось получить пароль: {str(e)}")
             return None
 
+    def data_version(self):
+        """Версия данных: меняется после записи через это соединение или любое другое (в том числе из других процессов)."""
+        return self.connection.total_changes, self.cursor.execute("PRAGMA main.data_version").fetchone()[0]
+
     def get_questions(self):
         """Получение всех вопросов из базы данных."""
         try:
-            self.cursor.execute("SELECT * FROM questions")
+            self.cursor.execute("SELECT id, question, correct_answer FROM questions")
             return self.cursor.fetchall()
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось получить вопросы: {str(e)}")
+            report_error(f"Не удалось получить вопросы: {str(e)}")
+            return []
+
+    def get_question_ids(self, test_id=None):
+        """Получение идентификаторов всех вопросов или вопросов теста (только индекс, повторно - из кэша)."""
+        if test_id is None:
+            sql, params = "SELECT id FROM questions", ()
+        else:
+            sql, params = "SELECT question_id FROM test_questions WHERE test_id = ?", (test_id,)
+        try:
+            return list(self.cache.get(self.manager, ("question_ids", test_id), lambda: tuple(
+                row[0] for row in self.cursor.execute(sql, params).fetchall())))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить вопросы: {str(e)}")
             return []
 
+    def get_question(self, question_id):
+        """Получение одного вопроса по идентификатору (через общий кэш)."""
+        try:
+            return self.cache.get(self.manager, ("question", question_id), lambda: self.cursor.execute(
+                "SELECT id, question, correct_answer FROM questions WHERE id = ?", (question_id,)).fetchone())
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить вопрос: {str(e)}")
+            return None
+
+    def draw_questions(self, count, seed, test_id=None):
+        """Случайная выборка идентификаторов вопросов для попытки (из всего банка или из теста)."""
+        return QuestionSampler(self).draw(count, seed, test_id)
+
+    def get_questions_page(self, after_id, limit, test_id=None):
+        """Получение страницы вопросов (всех или теста) с id больше after_id, по возрастанию id (через кэш)."""
+        if test_id is None:
+            sql = "SELECT id, question, correct_answer FROM questions WHERE id > ? ORDER BY id LIMIT ?"
+            params = (after_id, limit)
+        else:
+            sql = ("SELECT q.id, q.question, q.correct_answer FROM test_questions AS t "
+                   "JOIN questions AS q ON q.id = t.question_id "
+                   "WHERE t.test_id = ? AND t.question_id > ? ORDER BY t.question_id LIMIT ?")
+            params = (test_id, after_id, limit)
+        try:
+            return list(self.cache.get(self.manager, ("page", test_id, after_id, limit), lambda: tuple(
+                self.cursor.execute(sql, params).fetchall())))
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить вопросы: {str(e)}")
+            return []
+
+    def find_question(self, question):
+        """Идентификатор вопроса с таким же нормализованным текстом или None."""
+        try:
+            self.cursor.execute("SELECT id FROM questions WHERE content_hash = ?", (question_hash(question),))
+            row = self.cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            report_error(f"Не удалось найти вопрос: {str(e)}")
+            return None
+
     def insert_question(self, question, correct_answer):
-        """Добавление вопроса в базу данных."""
+        """Добавление вопроса в базу данных. Возвращает id нового вопроса (None, если такой уже есть)."""
         try:
-            self.cursor.execute("INSERT INTO questions (question, correct_answer) VALUES (?, ?)",
-                                (question, correct_answer))
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute("INSERT INTO questions (question, correct_answer, content_hash) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (content_hash) DO NOTHING",
+                                    (question, correct_answer, question_hash(question)))
+                if self.cursor.rowcount == 0:
+                    return None
+                question_id = self.cursor.lastrowid
+                self.store_answer_keys([(question_id, correct_answer)])
+            return question_id
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось добавить вопрос: {str(e)}")
+            report_error(f"Не удалось добавить вопрос: {str(e)}")
+            return None
 
     def delete_question(self, question_id):
         """Удаление вопроса по идентификатору."""
         try:
-            self.cursor.execute("DELETE FROM questions WHERE id = ?", (question_id,))
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute("DELETE FROM questions WHERE id = ?", (question_id,))
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось удалить вопрос: {str(e)}")
+            report_error(f"Не удалось удалить вопрос: {str(e)}")
+
+    def delete_questions(self, question_ids):
+        """Удаление нескольких вопросов по идентификаторам одной транзакцией."""
+        question_ids = list(question_ids)
+        try:
+            with self.manager.transaction():
+                for start in range(0, len(question_ids), SQL_IN_CHUNK_SIZE):
+                    chunk = question_ids[start:start + SQL_IN_CHUNK_SIZE]
+                    placeholders = ", ".join("?" * len(chunk))
+                    self.cursor.execute(f"DELETE FROM questions WHERE id IN ({placeholders})", chunk)
+        except sqlite3.Error as e:
+            report_error(f"Не удалось удалить вопросы: {str(e)}")
 
     # Доб авьте методы сохранения и загрузки вопросов из файла здесь
-    def load_questions_from_txt(self, filename):
-        """Загрузка вопросов из текстового файла."""
-        try:
-            with open(filename, 'r', encoding='utf-8') as file:
-                questions = file.readlines()
-                for line in questions:
-                    question, correct_answer = line.strip().split(';')  # Предполагается, что данные разделены ;
-                    self.insert_question(question, correct_answer)
+    def upsert_questions(self, batch, update_answers):
+        """Вставка пачки (вопрос, ответ, названия тестов, хеш); для уже существующих вопросов - пропуск
+        или обновление ответа с пересчётом ключей ответов. Вопросы добавляются в названные тесты
+        (недостающие тесты создаются)."""
+        rows = [(question, correct_answer, content_hash) for question, correct_answer, _, content_hash in batch]
+        memberships = [(name, content_hash) for _, _, tests, content_hash in batch for name in tests]
+        if memberships:
+            self.cursor.executemany("INSERT INTO tests (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+                                    [(name,) for name in dict.fromkeys(name for name, _ in memberships)])
+        if not update_answers:
+            self.cursor.executemany("INSERT INTO questions (question, correct_answer, content_hash) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (content_hash) DO NOTHING", rows)
+        else:
+            self.cursor.executemany("INSERT INTO questions (question, correct_answer, content_hash) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (content_hash) DO UPDATE SET correct_answer = excluded.correct_answer "
+                                    "WHERE correct_answer != excluded.correct_answer", rows)
+        self.store_test_memberships(memberships)
+        # Ключи ответов вопросов пачки: у новых их ещё нет, у обновлённых они устарели
+        hashes = list(dict.fromkeys(row[2] for row in rows))
+        for start in range(0, len(hashes), SQL_IN_CHUNK_SIZE):
+            chunk = hashes[start:start + SQL_IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            self.cursor.execute(f"SELECT id, correct_answer FROM questions WHERE content_hash IN ({placeholders})",
+                                chunk)
+            self.store_answer_keys(self.cursor.fetchall(), replace=update_answers)
+
+    def store_test_memberships(self, memberships):
+        """Добавление вопросов в тесты по парам (название теста, хеш вопроса); без транзакции."""
+        self.cursor.executemany("INSERT OR IGNORE INTO test_questions (test_id, question_id) "
+                                "SELECT tests.id, questions.id FROM tests, questions "
+                                "WHERE tests.name = ? AND questions.content_hash = ?", memberships)
+
+    def import_questions(self, filename, update_answers=False, progress=None, cancelled=None):
+        """Загрузка вопросов из файла любого формата QUESTION_FORMATS одной транзакцией.
+
+        Файл читается потоково, корректные записи вставляются пачками через executemany. Вопросы,
+        которые уже есть в банке, пропускаются (update_answers=True - у них обновляется ответ);
+        принадлежность тестам из файла восстанавливается.
+        progress(прочитано, всего) получает байты файла; cancelled() прерывает импорт с откатом.
+        Возвращает (число добавленных вопросов, список отклонённых записей вида
+        (номер, исходный текст, причина), число повторов). Ошибки передаются исключениями.
+        """
+        fmt = question_format_for(filename)
+        total = os.path.getsize(filename)
+        rejected = []
+        accepted = 0
+        batch = []
+        with self.manager.transaction():
+            self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM questions")
+            last_id = self.cursor.fetchone()[0]
+            with fmt.open_for_read(filename) as file:
+                for number, source, row, error in fmt.read_rows(file):
+                    if error:
+                        rejected.append((number, source, error))
+                        continue
+                    batch.append(row + (question_hash(row[0]),))
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        self.upsert_questions(batch, update_answers)
+                        accepted += len(batch)
+                        batch.clear()
+                        if cancelled is not None and cancelled():
+                            raise TransferCancelled()
+                        if progress is not None:
+                            progress(fmt.position(file), total)
+            if batch:
+                self.upsert_questions(batch, update_answers)
+                accepted += len(batch)
+            self.cursor.execute("SELECT COUNT(*) FROM questions WHERE id > ?", (last_id,))
+            inserted = self.cursor.fetchone()[0]
+        return inserted, rejected, accepted - inserted
+
+    def load_questions_from_txt(self, filename, update_answers=False):
+        """Загрузка вопросов из текстового файла одной транзакцией (см. import_questions).
+
+        Возвращает отчёт import_questions или None, если импорт не удался целиком.
+        """
+        try:
+            return self.import_questions(filename, update_answers)
         except Exception as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось загрузить вопросы: {str(e)}")
+            report_error(f"Не удалось загрузить вопросы: {str(e)}")
+            return None
+
+    def export_questions(self, filename, progress=None, cancelled=None):
+        """Потоковая запись всех вопросов в файл формата по расширению.
+
+        Строки читаются курсором без fetchall, пишутся через буфер во временный файл, который
+        заменяет filename только после успешного завершения. Вместе с вопросом пишутся названия
+        его тестов (в форматах, где для них есть место). Вопросы, которые формат не может передать
+        без искажений (';' и переводы строк в текстовом), пропускаются.
+        Возвращает (число записанных вопросов, список пропущенных вида (id, вопрос, причина)).
+        Ошибки передаются исключениями.
+        """
+        fmt = question_format_for(filename)
+        self.cursor.execute("SELECT COUNT(*) FROM questions")
+        total = self.cursor.fetchone()[0]
+        reader = self.connection.cursor()
+        temporary = filename + ".part"
+        written = 0
+        skipped = []
+        try:
+            reader.execute("SELECT id, question, correct_answer, (SELECT group_concat(tests.name, char(10)) "
+                           "FROM test_questions JOIN tests ON tests.id = test_questions.test_id "
+                           "WHERE test_questions.question_id = questions.id) FROM questions ORDER BY id")
+            with fmt.open_for_write(temporary) as file:
+                fmt.write_header(file)
+                for number, (question_id, question, correct_answer, tests) in enumerate(reader, start=1):
+                    error = fmt.write_row(file, (question_id, question, correct_answer,
+                                                 tuple(sorted(tests.split("\n"))) if tests else ()))
+                    if error:
+                        skipped.append((question_id, question, error))
+                    else:
+                        written += 1
+                    if number % PROGRESS_EVERY_ROWS == 0:
+                        if cancelled is not None and cancelled():
+                            raise TransferCancelled()
+                        if progress is not None:
+                            progress(number, total)
+            os.replace(temporary, filename)
+            return written, skipped
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        finally:
+            reader.close()
+
+    def replace_synced_file(self, path, parsed):
+        """Замена вопросов одного файла папки синхронизации; без транзакции.
+
+        parsed - (размер, время изменения, хеш содержимого, записи) или None, если файл удалён из папки.
+        Вопросы, которые исчезли из файла, удаляются из банка, если их добавила синхронизация и их нет
+        в других файлах. Возвращает (число добавленных вопросов, число удалённых).
+        """
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM questions")
+        last_id = self.cursor.fetchone()[0]
+        self.cursor.execute("SELECT question_id, created FROM synced_questions WHERE path = ?", (path,))
+        previous = dict(self.cursor.fetchall())
+        self.cursor.execute("DELETE FROM synced_questions WHERE path = ?", (path,))
+        current = set()
+        if parsed is None:
+            self.cursor.execute("DELETE FROM synced_files WHERE path = ?", (path,))
+        else:
+            size, mtime_ns, content_hash, rows = parsed
+            self.cursor.execute("INSERT INTO synced_files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?) "
+                                "ON CONFLICT (path) DO UPDATE SET size = excluded.size, "
+                                "mtime_ns = excluded.mtime_ns, content_hash = excluded.content_hash",
+                                (path, size, mtime_ns, content_hash))
+            for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+                self.upsert_questions(rows[start:start + IMPORT_BATCH_SIZE], update_answers=True)
+            hashes = list({row[3] for row in rows})
+            for start in range(0, len(hashes), SQL_IN_CHUNK_SIZE):
+                chunk = hashes[start:start + SQL_IN_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                self.cursor.execute(f"SELECT id FROM questions WHERE content_hash IN ({placeholders})", chunk)
+                current.update(row[0] for row in self.cursor.fetchall())
+            self.cursor.executemany("INSERT INTO synced_questions (path, question_id, created) VALUES (?, ?, ?)",
+                                    [(path, question_id, int(question_id > last_id or previous.get(question_id, 0)))
+                                     for question_id in current])
+        dropped = [question_id for question_id, created in previous.items() if created and question_id not in current]
+        deleted = 0
+        for start in range(0, len(dropped), SQL_IN_CHUNK_SIZE):
+            chunk = dropped[start:start + SQL_IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            # Вопрос остался в другом файле: теперь удалять его будет синхронизация этого файла
+            self.cursor.execute(f"UPDATE synced_questions SET created = 1 WHERE question_id IN ({placeholders})", chunk)
+            self.cursor.execute(f"DELETE FROM questions WHERE id IN ({placeholders}) AND NOT EXISTS "
+                                f"(SELECT 1 FROM synced_questions s WHERE s.question_id = questions.id)", chunk)
+            deleted += self.cursor.rowcount
+        self.cursor.execute("SELECT COUNT(*) FROM questions WHERE id > ?", (last_id,))
+        return self.cursor.fetchone()[0], deleted
+
+    def sync_question_folder(self, folder, progress=None, cancelled=None):
+        """Синхронизация банка с папкой файлов вопросов (форматы QUESTION_FORMATS).
+
+        Файлы, у которых совпали размер и время изменения с манифестом, не читаются; остальные
+        хешируются и разбираются параллельно в процессах пула, после чего вопросы каждого файла
+        заменяются отдельной транзакцией (прежние вопросы файла - на новые). Файлы, удалённые из
+        папки, убирают свои вопросы. progress(файлов обработано, всего); cancelled() останавливает
+        синхронизацию после текущего файла. Возвращает (обновлено файлов, удалено файлов,
+        добавлено вопросов, удалено вопросов, список отклонённых записей вида
+        (файл, номер, исходный текст, причина)).
+        """
+        folder = os.path.abspath(folder)
+        found = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if os.path.splitext(entry.name)[1].lower() in QUESTION_FORMATS and entry.is_file():
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        self.cursor.execute("SELECT path, size, mtime_ns, content_hash FROM synced_files")
+        manifest = {path: (size, mtime_ns, content_hash) for path, size, mtime_ns, content_hash
+                    in self.cursor.fetchall() if os.path.dirname(path) == folder}
+        changed = [(path, manifest[path][2] if path in manifest else None) for path, state in sorted(found.items())
+                   if path not in manifest or manifest[path][:2] != state]
+        removed = [path for path in manifest if path not in found]
+        total = len(changed) + len(removed)
+        done = updated = inserted = deleted = 0
+        rejected = []
+
+        for path in removed:
+            with self.manager.transaction():
+                deleted += self.replace_synced_file(path, None)[1]
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+        if len(changed) > 1:
+            import concurrent.futures
+            import multiprocessing
+            # Процессы запускаются заново (spawn): разбор не наследует потоки и соединения программы
+            pool = concurrent.futures.ProcessPoolExecutor(min(len(changed), os.cpu_count() or 1, SYNC_MAX_WORKERS),
+                                                          mp_context=multiprocessing.get_context("spawn"))
+            futures = {pool.submit(read_question_file, path, known_hash): path for path, known_hash in changed}
+            results = ((futures[future], future) for future in concurrent.futures.as_completed(futures))
+        else:
+            pool = None
+            results = ((path, functools.partial(read_question_file, path, known_hash))
+                       for path, known_hash in changed)
+        try:
+            for path, result in results:
+                if cancelled is not None and cancelled():
+                    raise TransferCancelled()
+                try:
+                    _, size, mtime_ns, content_hash, rows, file_rejected = (
+                        result.result() if pool is not None else result())
+                except (OSError, ValueError) as e:
+                    # Файл не прочитан: манифест не меняется, файл будет разобран при следующей синхронизации
+                    rejected.append((os.path.basename(path), 0, "", f"файл не прочитан: {str(e)}"))
+                    continue
+                finally:
+                    done += 1
+                    if progress is not None:
+                        progress(done, total)
+                with self.manager.transaction():
+                    if rows is None:  # Файл перезаписан без изменений
+                        self.cursor.execute("UPDATE synced_files SET size = ?, mtime_ns = ? WHERE path = ?",
+                                            (size, mtime_ns, path))
+                        continue
+                    added, dropped = self.replace_synced_file(path, (size, mtime_ns, content_hash, rows))
+                updated += 1
+                inserted += added
+                deleted += dropped
+                rejected.extend((os.path.basename(path),) + record for record in file_rejected)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return updated, len(removed), inserted, deleted, rejected
 
     def save_questions_to_txt(self, filename):
         """Сохранение вопросов в текстовый файл."""
         try:
-            questions = self.get_questions()
-            with open(filename, 'w', encoding='utf-8') as file:
-                for question in questions:
-                    file.write(
-                        f"{question[1]};{question[2]}\n")  # Предполагается, что в строку нужно записывать вопрос и ответ
+            _, skipped = self.export_questions(filename)
+            if skipped:
+                report_error(f"Не сохранено вопросов: {len(skipped)} ({skipped[0][2]})")
         except Exception as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось сохранить вопросы: {str(e)}")
+            report_error(f"Не удалось сохранить вопросы: {str(e)}")
 
     def clear_questions(self):
         """Очистка таблицы вопросов."""
         try:
-            self.cursor.execute("DELETE FROM questions")
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute("DELETE FROM questions")
+                self.cursor.execute("DELETE FROM synced_files")  # Следующая синхронизация загрузит папку заново
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось очистить вопросы: {str(e)}")
+            report_error(f"Не удалось очистить вопросы: {str(e)}")
 
     def update_password(self, current_password, new_password):
         """Изменение пароля в базе данных."""
@@ -160,17 +1809,213 @@ class Database:
         QMessageBox.information(None, "Успех", "Пароль успешно изменён.")
 
 
+def new_global_id():
+    """Случайный 63-битный идентификатор попытки или результата, уникальный между местами без обращения к базе."""
+    return random.SystemRandom().getrandbits(63)
+
+
+class QuestionSampler:
+    """Случайная выборка вопросов для попытки по индексу идентификаторов."""
+
+    def __init__(self, database):
+        self.database = database
+
+    @staticmethod
+    def new_seed():
+        """Новое зерно для попытки; по нему выборку можно воспроизвести."""
+        return random.SystemRandom().randrange(2 ** 32)
+
+    def draw(self, count, seed, test_id=None):
+        """Выбор count идентификаторов вопросов (0 - все вопросы в случайном порядке)."""
+        question_ids = self.database.get_question_ids(test_id)
+        rng = random.Random(seed)
+        if not count or count >= len(question_ids):
+            rng.shuffle(question_ids)
+            return question_ids
+        return rng.sample(question_ids, count)
+
+
+class QuizPack:
+    """Скомпилированный тест только для чтения: файл .qpack отображается в память (mmap).
+
+    Состав файла: заголовок (сигнатура, число вопросов, время, вопросов в попытке, длина названия,
+    смещение индекса), название, записи вопросов (тексты вопроса, ответа и ключей ответов в UTF-8)
+    и индекс из записей фиксированной длины (id, смещение, длины трёх текстов), упорядоченный по id.
+    Вопрос по номеру или по id (двоичный поиск по индексу) читается срезом отображения без разбора
+    файла целиком; в память попадают только прочитанные страницы. Для мест учеников, у которых
+    есть только папка с пакетами: ни SQLite, ни блокировок.
+    """
+
+    extension = ".qpack"
+    magic = b"QPACK1\n\0"
+    header = struct.Struct("<8sIIIIQ")
+    entry = struct.Struct("<qQIII")
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.count, self.duration, self.question_count, name_size, self.index_offset = \
+                self.header.unpack_from(self.map, 0)
+            if magic != self.magic or self.index_offset + self.count * self.entry.size > len(self.map):
+                raise ValueError("файл не является пакетом теста или повреждён")
+            self.name = self.map[self.header.size:self.header.size + name_size].decode("utf-8")
+        except (struct.error, ValueError):
+            self.map.close()
+            raise ValueError(f"{path}: файл не является пакетом теста или повреждён")
+
+    @classmethod
+    def compile(cls, database, filename, name, duration, question_count, test_id=None):
+        """Запись вопросов теста (или всего банка) в пакет. Возвращает число вопросов.
+
+        Файл пишется во временный и заменяет filename только целиком.
+        """
+        question_ids = sorted(database.get_question_ids(test_id))
+        encoded_name = name.encode("utf-8")
+        temporary = filename + ".part"
+        entries = []
+        try:
+            with open(temporary, 'wb', buffering=EXPORT_BUFFER_SIZE) as file:
+                file.write(bytes(cls.header.size) + encoded_name)
+                for start in range(0, len(question_ids), SQL_IN_CHUNK_SIZE):
+                    chunk = question_ids[start:start + SQL_IN_CHUNK_SIZE]
+                    placeholders = ", ".join("?" * len(chunk))
+                    keys = {}
+                    for question_id, answer_key in database.connection.execute(
+                            f"SELECT question_id, answer_key FROM answer_keys WHERE question_id IN ({placeholders})",
+                            chunk):
+                        keys.setdefault(question_id, []).append(answer_key)
+                    for question_id, question, correct_answer in database.connection.execute(
+                            f"SELECT id, question, correct_answer FROM questions WHERE id IN ({placeholders}) "
+                            f"ORDER BY id", chunk):
+                        texts = [question.encode("utf-8"), correct_answer.encode("utf-8"),
+                                 "\n".join(sorted(keys.get(question_id, []))).encode("utf-8")]
+                        entries.append(cls.entry.pack(question_id, file.tell(), *map(len, texts)))
+                        file.write(b"".join(texts))
+                index_offset = file.tell()
+                file.write(b"".join(entries))
+                file.seek(0)
+                file.write(cls.header.pack(cls.magic, len(entries), duration, question_count, len(encoded_name),
+                                           index_offset))
+            os.replace(temporary, filename)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return len(entries)
+
+    def read_entry(self, position):
+        return self.entry.unpack_from(self.map, self.index_offset + position * self.entry.size)
+
+    def question_at(self, position):
+        """Вопрос по номеру в пакете: (id, вопрос, правильный ответ, ключи ответов)."""
+        question_id, offset, question_size, answer_size, keys_size = self.read_entry(position)
+        answer_offset = offset + question_size
+        keys_offset = answer_offset + answer_size
+        keys = self.map[keys_offset:keys_offset + keys_size].decode("utf-8")
+        return (question_id, self.map[offset:answer_offset].decode("utf-8"),
+                self.map[answer_offset:keys_offset].decode("utf-8"), frozenset(keys.split("\n")) if keys else frozenset())
+
+    def find_position(self, question_id):
+        """Номер вопроса в пакете по id (двоичный поиск по индексу) или None."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.read_entry(middle)[0] < question_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.count and self.read_entry(low)[0] == question_id else None
+
+    # Те же методы чтения, что у Database, - StudentWindow работает с пакетом как с базой вопросов
+
+    def draw_questions(self, count, seed, test_id=None):
+        """Случайная выборка id вопросов пакета (0 - все в случайном порядке)."""
+        rng = random.Random(seed)
+        if not count or count >= self.count:
+            positions = list(range(self.count))
+            rng.shuffle(positions)
+        else:
+            positions = rng.sample(range(self.count), count)
+        return [self.read_entry(position)[0] for position in positions]
+
+    def get_question(self, question_id):
+        position = self.find_position(question_id)
+        return None if position is None else self.question_at(position)[:3]
+
+    def get_answer_keys(self, question_id):
+        position = self.find_position(question_id)
+        return frozenset() if position is None else self.question_at(position)[3]
+
+    def get_media_ids(self):
+        return {}  # Изображения в пакеты не входят
+
+    def close(self):
+        self.map.close()
+
+
+def find_quiz_packs(path):
+    """Пути пакетов тестов: сам файл или все файлы .qpack в папке (например, общей папке класса)."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(QuizPack.extension))
+    return [path]
+
+
 class QuizApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, server_address=None, pack_path=None):
         super().__init__()
         self.setWindowTitle("Программа для проверки знаний")
         self.setGeometry(0, 0, 1920, 1080)
 
-        self.database = Database()
-        self.results_database = ResultsDatabase()
+        # Базы данных открываются при первом обращении, чтобы окно появлялось без ожидания диска
+        self._database = None
+        self._results_database = None
         self.test_duration = 60
+        self.question_count = 0  # Число вопросов в попытке (0 - все вопросы)
+        self.typo_tolerance = 0  # Допустимое число опечаток в ответе
+        self.client = None  # Клиент сервера класса, если ученик работает через сервер
+        self.pack_path = pack_path  # Пакет теста или папка с пакетами для места ученика только для чтения
+        self.pack_names = {}  # Путь пакета -> ((mtime, размер), название): перечитывается, если файл заменили
+        self.pack = None  # Пакет текущей попытки: отображается в память только на время попытки
+        self.screens = OrderedDict()  # Готовые экраны по ключу, давно не открывавшиеся первыми
+        self.history = []  # Экраны, к которым возвращает кнопка "Назад"
 
         self.initUI()
+        if server_address:
+            self.connect_to_server(server_address)
+
+    @property
+    def database(self):
+        """База вопросов (открывается при первом обращении)."""
+        if self._database is None:
+            self._database = Database()
+            startup_phase("база вопросов открыта")
+        return self._database
+
+    @property
+    def results_database(self):
+        """База результатов (открывается при первом обращении)."""
+        if self._results_database is None:
+            if self.pack_path is not None:
+                # Место ученика с пакетами не открывает quiz.db: база результатов - самостоятельный файл
+                os.makedirs("db", exist_ok=True)
+                manager = ConnectionManager.for_path(os.path.join("db", "results.db"))
+                self._results_database = ResultsDatabase(manager=manager)
+            else:
+                self._results_database = ResultsDatabase()
+        return self._results_database
+
+    def shutdown(self):
+        """Дозапись результатов, отключение от сервера и закрытие баз (с переносом журналов WAL) перед выходом."""
+        if self._results_database is not None:
+            self._results_database.close()
+        if self._database is not None:
+            self._database.close()
+        if self.pack is not None:
+            self.pack.close()
+        self.disconnect_from_server()
+        ConnectionManager.close_all()
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -179,20 +2024,79 @@ class QuizApp(QMainWindow):
 
         student_button = QPushButton("Ученик")
         teacher_button = QPushButton("Учитель")
+        self.server_button = QPushButton("Подключиться к серверу класса")
 
         font_size = "font-size: 24px; padding: 20px;"
         student_button.setStyleSheet(font_size)
         teacher_button.setStyleSheet(font_size)
+        self.server_button.setStyleSheet(font_size)
 
         student_button.clicked.connect(self.name_lastname)
         teacher_button.clicked.connect(self.ask_password)
+        self.server_button.clicked.connect(self.ask_server_address)
 
         layout.addWidget(student_button)
         layout.addWidget(teacher_button)
+        layout.addWidget(self.server_button)
+
+        self.home = QWidget()
+        self.home.setLayout(layout)
+        self.home.setWindowTitle(self.windowTitle())
+        # Все экраны программы - страницы одного стека: переход между ними не создаёт окон
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.home)
+        self.setCentralWidget(self.stack)
+
+    def open_screen(self, key, factory):
+        """Переход к экрану key: готовый экран обновляет данные, при первом открытии он создаётся factory()."""
+        screen = self.screens.get(key)
+        if screen is None:
+            screen = factory()
+            self.screens[key] = screen
+        else:
+            self.screens.move_to_end(key)
+            screen.refresh()
+        self.push_screen(screen)
+        self.trim_screens()
+        return screen
 
-        container = QWidget()
-        container.setLayout(layout)
-        self.setCentralWidget(container)
+    def push_screen(self, screen):
+        """Показ экрана; текущий запоминается для возврата кнопкой "Назад"."""
+        if self.stack.indexOf(screen) < 0:
+            self.stack.addWidget(screen)
+        self.history.append(self.stack.currentWidget())
+        self.show_current(screen)
+
+    def close_screen(self, discard=False):
+        """Возврат к предыдущему экрану; discard=True удаляет закрытый экран (окно завершённой попытки)."""
+        screen = self.stack.currentWidget()
+        self.show_current(self.history.pop() if self.history else self.home)
+        if discard:
+            self.discard_screen(screen)
+
+    def discard_screen(self, screen):
+        """Удаление экрана из стека; closeEvent экрана останавливает его фоновые потоки."""
+        screen.close()
+        self.stack.removeWidget(screen)
+        screen.deleteLater()
+
+    def trim_screens(self):
+        """Удаление давно не открывавшихся экранов сверх SCREEN_CACHE_SIZE (кроме текущего и пути назад)."""
+        for key, screen in list(self.screens.items()):
+            if len(self.screens) <= SCREEN_CACHE_SIZE:
+                break
+            if screen is not self.stack.currentWidget() and screen not in self.history:
+                del self.screens[key]
+                self.discard_screen(screen)
+
+    def show_current(self, screen):
+        """Переключение страницы стека; главное меню показывается в окне, остальные экраны - на весь экран."""
+        self.stack.setCurrentWidget(screen)
+        self.setWindowTitle(screen.windowTitle())
+        if screen is self.home:
+            self.showNormal()
+        else:
+            self.showFullScreen()
 
     def keyPressEvent(self, event):
         """Закрытие приложения при нажатии Esc"""
@@ -209,10 +2113,91 @@ class QuizApp(QMainWindow):
 
     def show_student_window(self, student_name):
         """Показать окно ученика."""
-        self.student_window = StudentWindow(self.database, self.results_database, self, self.test_duration,
-                                            student_name)
-        self.student_window.show()
-        self.close()
+        if self.client is not None:
+            # Вопросы и настройки теста выдаёт сервер, результаты отправляются на него
+            settings = self.client.settings
+            student_window = StudentWindow(self.client, self.client, self, settings["duration"], student_name,
+                                           settings["question_count"], settings["typo_tolerance"])
+        elif self.pack_path is not None:
+            pack = self.choose_pack()
+            if pack is None:
+                return
+            self.pack = pack  # Закрывается окном попытки по её окончании
+            student_window = StudentWindow(pack, self.results_database, self, pack.duration, student_name,
+                                           pack.question_count, self.typo_tolerance)
+        else:
+            choice = StudentWindow.choose_test(self, self.database, self.test_duration, self.question_count)
+            if choice is None:
+                return
+            test_id, duration, question_count = choice
+            student_window = StudentWindow(self.database, self.results_database, self, duration,
+                                           student_name, question_count, self.typo_tolerance, test_id)
+        # Окно попытки не кэшируется: после завершения оно удаляется (close_screen с discard=True)
+        self.push_screen(student_window)
+
+    def choose_pack(self):
+        """Выбор пакета теста из файла или папки, заданных флагом --pack. None - пакет не выбран.
+
+        Выбранный пакет открывается заново для каждой попытки, поэтому ученик получает пакет, который
+        учитель заменил в общей папке; названия остальных пакетов перечитываются, только если
+        изменились время изменения или размер файла.
+        """
+        try:
+            paths = find_quiz_packs(self.pack_path)
+            names = []
+            for path in paths:
+                status = os.stat(path)
+                signature = (status.st_mtime_ns, status.st_size)
+                if self.pack_names.get(path, (None,))[0] != signature:
+                    pack = QuizPack(path)
+                    pack.close()
+                    self.pack_names[path] = (signature, pack.name)
+                names.append(self.pack_names[path][1])
+            if not paths:
+                QMessageBox.warning(self, "Ошибка", "В папке нет пакетов тестов.")
+                return None
+            index = 0
+            if len(paths) > 1:
+                name, ok = QInputDialog.getItem(self, "Выбор теста", "Выберите тест:", names, 0, False)
+                if not ok:
+                    return None
+                index = names.index(name)
+            return QuizPack(paths[index])
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть пакет теста: {str(e)}")
+            return None
+
+    def ask_server_address(self):
+        """Запрос адреса сервера класса (пустой адрес - работа с локальной базой)."""
+        address, ok = QInputDialog.getText(self, "Сервер класса",
+                                           f"Адрес сервера (например 192.168.0.10:{DEFAULT_SERVER_PORT}):")
+        if not ok:
+            return
+        if address.strip():
+            self.connect_to_server(address)
+        else:
+            self.disconnect_from_server()
+            QMessageBox.information(self, "Сервер класса", "Используется локальная база вопросов.")
+
+    def connect_to_server(self, address):
+        """Подключение к серверу класса."""
+        import http.client
+        client = QuizClient(address)
+        try:
+            client.get_settings()
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось подключиться к серверу {address}: {str(e)}")
+            return
+        self.disconnect_from_server()
+        self.client = client
+        self.server_button.setText(f"Сервер класса: {client.host}:{client.port}")
+
+    def disconnect_from_server(self):
+        """Возврат к работе с локальной базой."""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.server_button.setText("Подключиться к серверу класса")
 
     def show_set_password_window(self):
         """Открытие окна для установки пароля"""
@@ -240,13 +2225,12 @@ class QuizApp(QMainWindow):
 
     def show_admin_window(self):
         """Показать окно для учителя."""
-        self.teacher_window = Admin(self.database, self)
-        self.teacher_window.show()
-        self.close()
+        self.open_screen("admin", lambda: Admin(self.database, self))
 
 
 class StudentWindow(QWidget):
-    def __init__(self, database, results_database, parent, duration, student_name):
+    def __init__(self, database, results_database, parent, duration, student_name, question_count=0,
+                 typo_tolerance=0, test_id=None):
         super().__init__()
         self.database = database
         self.results_database = results_database
@@ -254,10 +2238,9 @@ class StudentWindow(QWidget):
         self.student_name = student_name
         self.quiz_ended = False
         self.duration = duration
+        self.typo_tolerance = typo_tolerance
 
         self.setWindowTitle("Ученик")
-        self.setGeometry(0, 0, 1920, 1080)
-        self.showFullScreen()
 
         # Создаем виджеты
         self.question_text_edit = QTextEdit(self)
@@ -265,6 +2248,16 @@ class StudentWindow(QWidget):
         self.question_text_edit.setStyleSheet("font-size: 40px; font-weight: bold;")
         self.question_text_edit.setReadOnly(True)
 
+        # Изображение вопроса; декодируется заранее в фоновом потоке (MediaLoader)
+        self.image_label = QLabel(self)
+        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.image_label.hide()
+        self.media = self.database.get_media_ids()
+        self.media_loader = None
+        if self.media:
+            self.media_loader = MediaLoader(os.path.basename(self.database.db_path), self)
+            self.media_loader.image_ready.connect(self.media_ready)
+
         self.answer_input = QLineEdit(self)
         self.answer_input.setPlaceholderText("Введите ваш ответ...")
 
@@ -282,20 +2275,48 @@ class StudentWindow(QWidget):
         self.timer_label.setStyleSheet("font-size: 16px; font-weight: bold;")
 
         self.score = 0
-        self.questions = self.database.get_questions()
+        # Выбираются только идентификаторы; текст вопроса подгружается по одному вперёд
+        self.seed = QuestionSampler.new_seed()
+        self.question_ids = self.database.draw_questions(question_count, self.seed, test_id)
+        self.current_question = None
+        self.next_question = None
+        self.answer_keys = {}  # Ключи ответов загруженных вопросов по id
         self.current_question_index = 0
+        self.attempt_id = None  # Попытка в журнале ответов
+        if self.question_ids:
+            self.attempt_id = self.results_database.start_attempt_async(self.student_name, self.seed,
+                                                                        len(self.question_ids))
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_timer)
         self.timer.start(1000)
 
-        if self.questions:
+        if self.question_ids:
             self.load_question()
         else:
             QMessageBox.warning(self, "Ошибка", "Нет доступных вопросов для теста!")
 
         self.initUI()
 
+    @staticmethod
+    def choose_test(parent, database, duration, question_count):
+        """Выбор теста перед началом попытки.
+
+        Возвращает (id теста или None для всех вопросов, время, число вопросов) или None при отмене.
+        Если тестов нет, выбор не показывается.
+        """
+        tests = database.get_tests()
+        if not tests:
+            return None, duration, question_count
+        names = [ALL_QUESTIONS_TITLE] + [name for _, name, _, _ in tests]
+        name, ok = QInputDialog.getItem(parent, "Выбор теста", "Выберите тест:", names, 0, False)
+        if not ok:
+            return None
+        if name == ALL_QUESTIONS_TITLE:
+            return None, duration, question_count
+        test_id, _, test_duration, test_question_count = tests[names.index(name) - 1]
+        return test_id, test_duration, test_question_count
+
     def keyPressEvent(self, event):
         """Закрытие приложения при нажатии Esc"""
         if event.key() == Qt.Key.Key_Escape:
@@ -322,6 +2343,7 @@ class StudentWindow(QWidget):
         self.submit_button.setStyleSheet(font_size)
 
         layout.addWidget(self.question_text_edit)
+        layout.addWidget(self.image_label)
         layout.addWidget(self.correct_answer_counter)
         layout.addWidget(self.timer_label)
         layout.addWidget(self.answer_input)
@@ -333,34 +2355,107 @@ class StudentWindow(QWidget):
 
         self.setLayout(layout)
 
+    def fetch_question(self, index):
+        """Получение вопроса с номером index из выборки; для шаблона - вариант по зерну попытки."""
+        if index < len(self.question_ids):
+            question_id = self.question_ids[index]
+            row = self.database.get_question(question_id)
+            if row is None:
+                return None
+            try:
+                template = question_template(row[1], row[2])
+                if template is not None:
+                    text, answer = template.instantiate(self.seed, question_id)
+                    self.answer_keys[question_id] = answer_keys_for(answer)
+                    return question_id, text, answer
+            except TemplateError as e:
+                return question_id, f"{row[1]}\n(Ошибка в шаблоне вопроса: {str(e)})", ""
+            if question_id not in self.answer_keys:
+                self.answer_keys[question_id] = self.database.get_answer_keys(question_id)
+            return row
+        return None
+
+    def prefetch_next_question(self):
+        """Заблаговременная загрузка следующего вопроса и его изображения."""
+        if self.quiz_ended:
+            return  # Попытка завершилась раньше, чем сработал таймер (пакет теста уже закрыт)
+        self.next_question = self.fetch_question(self.current_question_index + 1)
+        if self.next_question is not None:
+            self.prefetch_media(self.next_question[0])
+
+    def prefetch_media(self, question_id):
+        """Запрос изображения вопроса у фонового потока, если его ещё нет в кэше."""
+        checksum = self.media.get(question_id)
+        if checksum is not None and pixmap_cache.get((question_id, checksum)) is None:
+            self.media_loader.request(question_id, checksum)
+
+    def show_media(self, question_id):
+        """Показ изображения вопроса из кэша; если оно ещё готовится, покажется по сигналу media_ready."""
+        checksum = self.media.get(question_id)
+        if checksum is None:
+            self.image_label.clear()
+            self.image_label.hide()
+            return
+        pixmap = pixmap_cache.get((question_id, checksum))
+        if pixmap is not None:
+            self.image_label.setPixmap(pixmap)
+        else:
+            self.image_label.setText("Загрузка изображения...")
+            self.prefetch_media(question_id)
+        self.image_label.show()
+
+    def media_ready(self, question_id, checksum, image):
+        """Изображение подготовлено фоновым потоком."""
+        if image.isNull():
+            if self.current_question and self.current_question[0] == question_id:
+                self.image_label.setText("Не удалось показать изображение")
+            return
+        pixmap_cache.put((question_id, checksum), QPixmap.fromImage(image))
+        if self.current_question and self.current_question[0] == question_id:
+            self.show_media(question_id)
+
     def load_question(self):
         """Загрузка следующего вопроса"""
-        if self.current_question_index < len(self.questions):
+        if self.current_question_index < len(self.question_ids):
+            if self.next_question is not None and self.next_question[0] == self.question_ids[
+                    self.current_question_index]:
+                self.current_question = self.next_question
+            else:
+                self.current_question = self.fetch_question(self.current_question_index)
+            self.next_question = None
             question_number = self.current_question_index + 1
-            question_text = self.questions[self.current_question_index][1]
+            question_text = self.current_question[1] if self.current_question else ""
             self.question_text_edit.setPlainText(f"Вопрос {question_number}: {question_text}")
+            if self.current_question:
+                self.show_media(self.current_question[0])
             self.answer_input.clear()
+            QTimer.singleShot(0, self.prefetch_next_question)  # После отрисовки текущего вопроса
         else:
             self.end_quiz()
 
     def check_answer(self):
         """Проверка ответа пользователя"""
         answer = self.answer_input.text()
-        correct_answer = self.questions[self.current_question_index][2] if self.current_question_index < len(
-            self.questions) else None
+        correct_answer = self.current_question[2] if self.current_question_index < len(
+            self.question_ids) and self.current_question else None
 
         if answer == '':
             QMessageBox.information(self, "Ошибка!", 'Вы не ввели ответ ')
         elif correct_answer:
-            if answer.strip().lower() == correct_answer.strip().lower():
+            answer_keys = self.answer_keys.get(self.current_question[0]) or answer_keys_for(correct_answer)
+            correct = is_answer_correct(answer, answer_keys, self.typo_tolerance)
+            self.results_database.record_answer_async(self.attempt_id, self.current_question_index,
+                                                      self.current_question[0], answer, correct)
+            if correct:
                 self.score += 1
                 self.correct_answer_counter.setText(f"Правильные ответы: {self.score}")
             else:
-                QMessageBox.warning(self, "Неправильно!", f"Правильный ответ: {correct_answer}")
+                shown_answer = " или ".join(part.strip() for part in correct_answer.split(ANSWER_SEPARATOR))
+                QMessageBox.warning(self, "Неправильно!", f"Правильный ответ: {shown_answer}")
 
         self.current_question_index += 1
 
-        if self.current_question_index < len(self.questions):
+        if self.current_question_index < len(self.question_ids):
             self.load_question()
         else:
             self.duration = 0  # Обнуляем таймер до завершения викторины
@@ -372,16 +2467,16 @@ class StudentWindow(QWidget):
             return
 
         self.quiz_ended = True
+        self.timer.stop()
         grade = self.calculate_grade(self.score)
-        self.results_database.insert_result(self.student_name, self.score)
+        self.results_database.insert_result_async(self.student_name, self.score, self.attempt_id)
         QMessageBox.information(self, "Викторина завершена!",
-                                f"Ваш результат: {self.score} из {len(self.questions)}.\nВаша оценка: {grade}.")
-        self.close()
-        self.parent.show()
+                                f"Ваш результат: {self.score} из {len(self.question_ids)}.\nВаша оценка: {grade}.")
+        self.parent.close_screen(discard=True)
 
     def calculate_grade(self, score):
         """Подсчёт оценки"""
-        total_questions = len(self.questions)
+        total_questions = len(self.question_ids)
         if total_questions == 0:
             return "Нет вопросов"
 
@@ -395,10 +2490,21 @@ class StudentWindow(QWidget):
             return "Неудовлетворительно\n оценка 2"
 
     def go_back(self):
-        """Возврат к главному окну"""
+        """Возврат к главному окну; незавершённая попытка завершается с набранным результатом."""
         self.duration = 0  # Обнуляем таймер перед возвратом
-        self.parent.show()
-        self.close()
+        if self.quiz_ended:
+            self.parent.close_screen(discard=True)
+        else:
+            self.end_quiz()
+
+    def closeEvent(self, event):
+        """Остановка фоновой загрузки изображений и закрытие пакета теста при закрытии окна."""
+        if self.media_loader is not None:
+            self.media_loader.stop()
+        if isinstance(self.database, QuizPack):
+            # Пакет отображён в память только на время попытки: иначе учитель не сможет заменить файл (Windows)
+            self.database.close()
+        super().closeEvent(event)
 
 
 class Admin(QWidget):
@@ -410,14 +2516,18 @@ class Admin(QWidget):
         self.parent = parent
 
         self.setWindowTitle("Админ")
-        self.setGeometry(100, 100, 400, 300)
-        self.showFullScreen()
 
         # Кнопки интерфейса
         self.submit_button = QPushButton("Проверить результаты учеников", self)
+        self.statistics_button = QPushButton("Статистика вопросов", self)
+        self.leaderboard_button = QPushButton("Рейтинг класса", self)
         self.delete_button = QPushButton("Изменение вопросов", self)
         self.set_time_button = QPushButton("Установить время теста", self)
+        self.set_count_button = QPushButton("Установить число вопросов", self)
+        self.set_typos_button = QPushButton("Допустимые опечатки в ответах", self)
         self.change_password_button = QPushButton("Изменить пароль", self)  # Кнопка изменения пароля
+        self.diagnostics_button = QPushButton("Диагностика", self)
+        self.compile_pack_button = QPushButton("Собрать пакет теста для учеников", self)
         self.back_button = QPushButton("Назад", self)
 
         self.initUI()
@@ -430,16 +2540,28 @@ class Admin(QWidget):
 
         # Добавление кнопок в макет
         layout.addWidget(self.submit_button)
+        layout.addWidget(self.statistics_button)
+        layout.addWidget(self.leaderboard_button)
         layout.addWidget(self.set_time_button)
+        layout.addWidget(self.set_count_button)
+        layout.addWidget(self.set_typos_button)
         layout.addWidget(self.delete_button)
         layout.addWidget(self.change_password_button)  # Добавление кнопки изменения пароля
+        layout.addWidget(self.compile_pack_button)
+        layout.addWidget(self.diagnostics_button)
         layout.addWidget(self.back_button)
 
         font_size = "font-size: 24px; padding: 20px;"
         self.submit_button.setStyleSheet(font_size)
+        self.statistics_button.setStyleSheet(font_size)
+        self.leaderboard_button.setStyleSheet(font_size)
         self.set_time_button.setStyleSheet(font_size)
+        self.set_count_button.setStyleSheet(font_size)
+        self.set_typos_button.setStyleSheet(font_size)
         self.delete_button.setStyleSheet(font_size)
         self.change_password_button.setStyleSheet(font_size)  # Стилизация кнопки изменения пароля
+        self.diagnostics_button.setStyleSheet(font_size)
+        self.compile_pack_button.setStyleSheet(font_size)
         self.back_button.setStyleSheet(font_size)
 
         self.setLayout(layout)
@@ -448,8 +2570,14 @@ class Admin(QWidget):
         self.back_button.clicked.connect(self.go_back)
         self.delete_button.clicked.connect(self.show_correct_window)
         self.set_time_button.clicked.connect(self.ask_time)
+        self.set_count_button.clicked.connect(self.ask_question_count)
+        self.set_typos_button.clicked.connect(self.ask_typo_tolerance)
         self.submit_button.clicked.connect(self.show_results_window)
+        self.statistics_button.clicked.connect(self.show_statistics_window)
+        self.leaderboard_button.clicked.connect(self.show_leaderboard_window)
         self.change_password_button.clicked.connect(self.change_password)  # Подключение кнопки
+        self.diagnostics_button.clicked.connect(self.show_diagnostics_window)
+        self.compile_pack_button.clicked.connect(self.compile_pack)
 
     def keyPressEvent(self, event):
         """Закрытие приложения при нажатии Esc"""
@@ -458,9 +2586,43 @@ class Admin(QWidget):
 
     def show_results_window(self):
         """Показать окно с результатами учеников."""
-        self.results_window = ResultsWindow(self.database, self.parent.results_database, self)
-        self.results_window.show()
-        self.close()
+        self.parent.open_screen("results", lambda: ResultsWindow(self.database, self.parent.results_database, self))
+
+    def compile_pack(self):
+        """Сборка пакета теста (.qpack) для мест учеников, запускаемых с флагом --pack."""
+        chosen, test = self.choose_test("Собрать пакет теста")
+        if not chosen:
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить пакет теста", "",
+                                                  f"Пакет теста (*{QuizPack.extension})")
+        if not filename:
+            return
+        if not filename.endswith(QuizPack.extension):
+            filename += QuizPack.extension
+        if test:
+            test_id, name, duration, question_count = test
+        else:
+            test_id, name, duration, question_count = (None, ALL_QUESTIONS_TITLE, self.parent.test_duration,
+                                                       self.parent.question_count)
+        try:
+            count = QuizPack.compile(self.database, filename, name, duration, question_count, test_id)
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось собрать пакет теста: {str(e)}")
+            return
+        QMessageBox.information(self, "Успех", f"Пакет теста \"{name}\" собран: {count} вопросов.")
+
+    def show_diagnostics_window(self):
+        """Показать окно с замерами длительности операций."""
+        self.parent.open_screen("diagnostics", lambda: DiagnosticsWindow(self))
+
+    def show_leaderboard_window(self):
+        """Показать рейтинг класса, обновляемый по мере поступления результатов."""
+        self.parent.open_screen("leaderboard", lambda: LeaderboardWindow(self.parent.results_database, self))
+
+    def show_statistics_window(self):
+        """Показать окно со статистикой вопросов."""
+        self.parent.open_screen("statistics", lambda: StatisticsWindow(self.parent.results_database, self,
+                                                                       self.parent.pack_path))
 
     def change_password(self):
         """Функция для изменения пароля."""
@@ -471,100 +2633,721 @@ class Admin(QWidget):
 
         new_password, ok2 = QInputDialog.getText(self, "Изменение пароля", "Введите новый пароль:")
         if ok2 and new_password != "":
-            print(f"Текущий пароль: {current_password}, Новый пароль: {new_password}")
             self.database.update_password(current_password, new_password)
         else:
-            QMessageBox.warning(self, "Ошибка", "Вы должны ввести новый пароль.")
+            QMessageBox.warning(self, "Ошибка", "Вы должны ввести новый пароль.")
+
+    def refresh(self):
+        """Экран без данных: настройки читаются при каждом запросе."""
+
+    def go_back(self):
+        """Возврат к главному окну."""
+        self.parent.close_screen()
+
+    def show_correct_window(self):
+        """Показать окно учителя."""
+        self.parent.open_screen("teacher", lambda: TeacherWindow(self.database, self))
+
+    def choose_test(self, title):
+        """Выбор теста для настройки. Возвращает (выбран ли, строка теста или None для всех вопросов)."""
+        tests = self.database.get_tests()
+        if not tests:
+            return True, None
+        names = [ALL_QUESTIONS_TITLE] + [name for _, name, _, _ in tests]
+        name, ok = QInputDialog.getItem(self, title, "Выберите тест:", names, 0, False)
+        if not ok:
+            return False, None
+        return True, None if name == ALL_QUESTIONS_TITLE else tests[names.index(name) - 1]
+
+    def ask_time(self):
+        """Запрос времени для теста у учителя."""
+        chosen, test = self.choose_test("Установить время теста")
+        if not chosen:
+            return
+        current = (test[2] if test else self.parent.test_duration) // 60
+        time, ok = QInputDialog.getInt(self, "Установить время теста", "Введите время в минутах:",
+                                       value=max(1, current), min=1)
+        if ok:
+            duration = time * 60
+            if test:
+                self.database.update_test(test[0], duration=duration)
+            else:
+                self.parent.test_duration = duration
+            QMessageBox.information(self, "Успех", f"Время теста установлено на {time} минут(ы).")
+
+    def ask_question_count(self):
+        """Запрос числа вопросов в одной попытке теста."""
+        chosen, test = self.choose_test("Установить число вопросов")
+        if not chosen:
+            return
+        count, ok = QInputDialog.getInt(self, "Установить число вопросов",
+                                        "Введите число вопросов (0 - все вопросы):",
+                                        value=test[3] if test else self.parent.question_count, min=0)
+        if ok:
+            if test:
+                self.database.update_test(test[0], question_count=count)
+            else:
+                self.parent.question_count = count
+            if count:
+                QMessageBox.information(self, "Успех", f"Ученику будет выдано {count} случайных вопросов.")
+            else:
+                QMessageBox.information(self, "Успех", "Ученику будут выданы все вопросы в случайном порядке.")
+
+    def ask_typo_tolerance(self):
+        """Запрос допустимого числа опечаток в текстовых ответах."""
+        typos, ok = QInputDialog.getInt(self, "Допустимые опечатки",
+                                        "Сколько опечаток допускать в ответе (0 - ответ должен совпадать):",
+                                        value=self.parent.typo_tolerance, min=0, max=3)
+        if ok:
+            self.parent.typo_tolerance = typos
+            QMessageBox.information(self, "Успех", f"Допустимое число опечаток: {typos}.")
+
+
+class ResultWriter(threading.Thread):
+    """Фоновая запись в базу результатов пачками (group commit).
+
+    Записи - пары [SQL, параметры] или группы {"records": [записи]}, которые пишутся только вместе
+    (одной транзакцией). Поток держит своё соединение, повторяет запись при блокировке,
+    а то, что записать не удалось, сохраняет в файл-спул и дописывает при следующем запуске.
+    Записи, которые база отвергает, откладываются в файл .rejected и не задерживают остальные.
+    """
+
+    STOP = object()
+
+    def __init__(self, db_path, spool_path=None):
+        super().__init__(name=type(self).__name__, daemon=True)
+        self.db_path = db_path
+        self.spool_path = spool_path or db_path + ".spool"
+        self.queue = queue.Queue()
+        self.closed = False
+        self.unmarked = False  # Снята ли с базы отметка CLEAN_CLOSE_MARK
+        atexit.register(self.close)
+
+    def submit(self, record):
+        """Постановка записи в очередь (не блокирует вызывающий поток)."""
+        self.queue.put(record)
+
+    def open_connection(self):
+        """Соединение, через которое поток пишет пачки."""
+        return sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+
+    def run(self):
+        connection = self.open_connection()
+        try:
+            self.replay_spool(connection)
+            stopping = False
+            while not stopping:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + GROUP_COMMIT_DELAY_SECONDS
+                while len(batch) < GROUP_COMMIT_MAX_BATCH:
+                    try:
+                        batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                if self.STOP in batch:
+                    stopping = True
+                    batch = [item for item in batch if item is not self.STOP]
+                    while not self.queue.empty():
+                        batch.append(self.queue.get_nowait())
+                try:
+                    pending = self.store(connection, batch) if batch else []
+                    if pending:
+                        self.spool(self.spool_path, pending)
+                except Exception as e:  # Поток не должен останавливаться: flush() ждёт task_done
+                    report_error(f"Не удалось сохранить результаты: {str(e)}")
+                finally:
+                    for _ in range(len(batch) + stopping):
+                        self.queue.task_done()
+        finally:
+            connection.close()
+
+    def store(self, connection, batch):
+        """Запись пачки, а если она отвергнута - по одной записи, чтобы найти неверные.
+
+        Отвергнутые записи откладываются в файл .rejected. Возвращает записи, которые не удалось
+        записать сейчас (база занята), - их нужно сохранить в спул.
+        """
+        try:
+            return [] if self.write_batch(connection, batch) else batch
+        except (sqlite3.Error, ValueError):
+            pass
+        pending = []
+        for record in batch:
+            try:
+                if not self.write_batch(connection, [record]):
+                    pending.append(record)
+            except (sqlite3.Error, ValueError) as e:
+                self.spool(self.spool_path + ".rejected", [record])
+                report_error(f"Запись результата отвергнута ({str(e)}) и сохранена в {self.spool_path}.rejected")
+        return pending
+
+    def write_batch(self, connection, batch):
+        """Запись пачки одной транзакцией с повторами при блокировке.
+
+        Возвращает False, если база так и осталась занятой; ошибку в самих записях передаёт исключением.
+        """
+        for attempt in range(RESULT_WRITE_RETRIES):
+            try:
+                if not self.unmarked:
+                    clear_clean_close_mark(connection, "main")
+                    self.unmarked = True
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    for item in batch:
+                        for sql, params in item["records"] if isinstance(item, dict) else [item]:
+                            connection.execute(sql, params)
+                    connection.execute("COMMIT")
+                    return True
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+        return False
+
+    @staticmethod
+    def spool(path, batch):
+        """Дозапись записей в файл-спул path (по записи JSON в строке)."""
+        with open(path, 'a', encoding='utf-8') as file:
+            for record in batch:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def replay_spool(self, connection):
+        """Дозапись результатов, оставшихся в спуле с прошлого запуска; в спуле остаётся то, что снова не записалось."""
+        if not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path, 'r', encoding='utf-8') as file:
+                batch = [json.loads(line) for line in file if line.strip()]
+            pending = self.store(connection, batch) if batch else []
+            if pending:
+                self.spool(self.spool_path + ".tmp", pending)
+                os.replace(self.spool_path + ".tmp", self.spool_path)
+            else:
+                os.remove(self.spool_path)
+        except Exception as e:
+            report_error(f"Не удалось дозаписать результаты из {self.spool_path}: {str(e)}")
+
+    def flush(self):
+        """Ожидание записи всех поставленных в очередь результатов."""
+        self.queue.join()
+
+    def close(self):
+        """Дозапись очереди и остановка потока (вызывается и при выходе из приложения)."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.is_alive():
+            self.queue.put(self.STOP)
+            self.join()
+
+
+class PayloadTooLarge(ValueError):
+    """Сервер класса отверг запрос как слишком большой (HTTP 413)."""
+
+
+class ResultUploader(ResultWriter):
+    """Фоновая отправка результатов на сервер класса пачками; неотправленное остаётся в спуле.
+
+    Пачку, которую сервер отверг как слишком большую, отправляют половинами; запись, которая не
+    проходит и одна, откладывается в файл .rejected (см. ResultWriter.store).
+    """
+
+    def __init__(self, client, spool_path):
+        super().__init__(None, spool_path)
+        self.client = client
+
+    def open_connection(self):
+        return self.client.open_connection()
+
+    def write_batch(self, connection, batch):
+        import http.client
+        for attempt in range(RESULT_WRITE_RETRIES):
+            try:
+                self.client.request("POST", "/results", {"results": batch}, connection)
+                return True
+            except PayloadTooLarge:
+                if len(batch) == 1:
+                    raise
+                middle = len(batch) // 2
+                return self.write_batch(connection, batch[:middle]) and self.write_batch(connection, batch[middle:])
+            except (OSError, http.client.HTTPException):
+                connection.close()  # Следующий запрос переподключится
+                time.sleep(0.1 * 2 ** attempt)
+        return False  # ValueError (сервер отверг пачку) передаётся в store
+
+
+class QuizClient:
+    """Клиент сервера класса: источник вопросов и приёмник результатов для StudentWindow."""
+
+    def __init__(self, address):
+        host, _, port = address.strip().rpartition(":") if ":" in address else (address.strip(), "", "")
+        self.host = host
+        self.port = int(port) if port else DEFAULT_SERVER_PORT
+        self.connection = None
+        self.settings = {}
+        self.questions = {}
+        self.answer_keys = {}
+        self.uploader = None
+
+    def open_connection(self):
+        import http.client
+        return http.client.HTTPConnection(self.host, self.port, timeout=SERVER_TIMEOUT_SECONDS)
+
+    def request(self, method, path, payload=None, connection=None):
+        """JSON-запрос к серверу по постоянному (keep-alive) соединению."""
+        if connection is None:
+            if self.connection is None:
+                self.connection = self.open_connection()
+            connection = self.connection
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = json.loads(response.read().decode("utf-8") or "{}")
+        if response.status == 413:
+            raise PayloadTooLarge(data.get("error", "HTTP 413"))
+        if response.status != 200:
+            raise ValueError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def get_settings(self):
+        """Настройки теста, заданные на сервере (время, число вопросов, опечатки)."""
+        self.settings = self.request("GET", "/settings")
+        return self.settings
+
+    def draw_questions(self, count, seed, test_id=None):
+        """Получение выборки вопросов с сервера одним запросом."""
+        import http.client
+        test = "" if test_id is None else f"&test={int(test_id)}"
+        try:
+            data = self.request("GET", f"/questions?count={int(count)}&seed={int(seed)}{test}")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            if self.connection is not None:
+                self.connection.close()
+            report_error(f"Не удалось получить вопросы с сервера: {str(e)}")
+            return []
+        self.questions = {item["id"]: (item["id"], item["question"], item["correct_answer"])
+                          for item in data["questions"]}
+        self.answer_keys = {item["id"]: set(item["answer_keys"]) for item in data["questions"]}
+        return [item["id"] for item in data["questions"]]
+
+    def get_question(self, question_id):
+        return self.questions.get(question_id)
+
+    def get_answer_keys(self, question_id):
+        return self.answer_keys.get(question_id, set())
+
+    def get_media_ids(self):
+        return {}  # Сервер класса раздаёт только текст вопросов
+
+    def submit_async(self, record):
+        """Постановка записи в очередь отправки на сервер."""
+        if self.uploader is None:
+            self.uploader = ResultUploader(self, os.path.join("db", "results_upload.spool"))
+            self.uploader.start()
+        self.uploader.submit(record)
+
+    def start_attempt_async(self, name, seed, question_count):
+        """Начало попытки в журнале сервера. Возвращает идентификатор попытки."""
+        attempt_id = new_global_id()
+        self.submit_async({"kind": "attempt", "attempt_id": attempt_id, "name": name, "seed": seed,
+                           "question_count": question_count})
+        return attempt_id
+
+    def record_answer_async(self, attempt_id, position, question_id, answer, correct):
+        """Отправка ответа на вопрос в журнал попытки на сервере."""
+        self.submit_async({"kind": "answer", "attempt_id": attempt_id, "position": position,
+                           "question_id": question_id, "answer": answer, "correct": bool(correct)})
+
+    def insert_result_async(self, name, score, attempt_id=None):
+        """Отправка результата на сервер в фоновом потоке."""
+        # uid выдаётся здесь, поэтому повторная отправка пачки не задваивает результат и без попытки
+        self.submit_async({"name": name, "score": score, "attempt_id": attempt_id,
+                           "uid": new_global_id() if attempt_id is None else attempt_id})
+
+    def close(self):
+        """Дозапись очереди результатов и закрытие соединения."""
+        if self.uploader is not None:
+            self.uploader.close()
+            self.uploader = None
+        if self.connection is not None:
+            self.connection.close()
+
+
+def find_results_files(paths):
+    """Файлы баз результатов: указанные файлы и все файлы .db в указанных папках."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".db")))
+        else:
+            files.append(path)
+    return files
 
-    def go_back(self):
-        """Возврат к главному окну."""
-        self.parent.show()
-        self.close()
 
-    def show_correct_window(self):
-        """Показать окно учителя."""
-        self.correct_window = TeacherWindow(self.database, self)
-        self.correct_window.show()
-        self.close()
+def merge_source_uri(filename):
+    """URI файла базы результатов с места ученика для подключения только для чтения.
 
-    def ask_time(self):
-        """Запрос времени для теста у учителя."""
-        time, ok = QInputDialog.getInt(self, "Установить время теста", "Введите время в минутах:", value=1, min=1)
-        if ok:
-            duration = time * 60
-            self.parent.test_duration = duration
-            QMessageBox.information(self, "Успех", f"Время теста установлено на {time} минут(ы).")
+    Файл в режиме WAL без своего -wal рядом и без отметки CLEAN_CLOSE_MARK (её ставит закрытие
+    программы) скопирован, пока программа на месте ученика работала: последние результаты остались
+    в журнале, поэтому такой файл отвергается, а не сливается частично.
+    """
+    with open(filename, "rb") as file:
+        header = file.read(100)
+    if header and not header.startswith(b"SQLite format 3\x00"):
+        raise ValueError(f"{filename}: это не файл базы данных")
+    if len(header) >= 72 and header[18] == 2 and int.from_bytes(header[68:72], "big") != CLEAN_CLOSE_MARK \
+            and not os.path.exists(filename + "-wal"):
+        raise ValueError(f"{filename}: файл скопирован без журнала {os.path.basename(filename)}-wal, "
+                         f"часть результатов может быть в нём; скопируйте файл вместе с журналом "
+                         f"или закройте программу на месте ученика перед копированием")
+    import pathlib
+    return pathlib.Path(filename).resolve().as_uri() + "?mode=ro"
+
+
+def legacy_result_uid(seat, result_id, name, score):
+    """uid результата из файла старой версии без столбца uid (см. ResultsDatabase.merge_schema)."""
+    key = f"{seat}\n{result_id}:{name}:{score}"
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
 
 
 class ResultsDatabase:
     """Класс для управления базой данных результатов."""
 
-    def __init__(self, db_name="results.db"):
+    def __init__(self, db_name="results.db", manager=None):
         self.db_folder = "db"
         if not os.path.exists(self.db_folder):
             os.makedirs(self.db_folder)
 
         self.db_path = os.path.join(self.db_folder, db_name)
+        self.manager = manager
+        self.schema = None
+        self.writer = None
+        self.group = None  # Записи, собираемые group_async
         self.connection = None
         self.cursor = None
         self.connect(self.db_path)
 
     def connect(self, db_name):
-        """Соединение с базой данных для результатов."""
+        """Подключение базы результатов к общему соединению."""
         try:
-            self.connection = sqlite3.connect(db_name)
+            if self.manager is None:
+                self.manager = ConnectionManager.for_path(os.path.join(self.db_folder, "quiz.db"))
+            self.schema = self.manager.attach(db_name, "results_db")
+            self.connection = self.manager.connection
             self.cursor = self.connection.cursor()
-            self.create_tables()
+            self.manager.migrate(self.schema, self.migrations())
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось подключиться к базе данных результатов: {str(e)}")
+            report_error(f"Не удалось подключиться к базе данных результатов: {str(e)}")
             sys.exit(1)
 
+    def migrations(self):
+        """Шаги схемы базы результатов по порядку версий (см. Database.migrations)."""
+        return [
+            self.create_tables,
+            functools.partial(self.add_result_uids, self.schema),
+            self.create_attempt_tables,
+            self.create_result_name_index,
+        ]
+
     def create_tables(self):
         """Создание таблицы для результатов, если она не существует."""
-        try:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    score INTEGER NOT NULL
-                )
-            """)
-            self.connection.commit()
-        except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось создать таблицу результатов: {str(e)}")
-            sys.exit(1)
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                uid INTEGER  -- Глобально уникальный id: по нему слияние баз не задваивает результаты
+            )
+        """)
+
+    def create_result_name_index(self):
+        """Индекс результатов по ученику: итоги рейтинга класса считаются по нему без сортировки истории."""
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.schema}.results_name ON results (name, score)")
+
+    def add_result_uids(self, schema):
+        """Столбец uid в таблице результатов схемы schema (в старых базах - с заполнением), индекс и триггер.
+
+        Триггер выдаёт uid результатам, записанным без него (например, из спула старой версии).
+        """
+        columns = [row[1] for row in self.cursor.execute(f"PRAGMA {schema}.table_info(results)")]
+        if "uid" not in columns:
+            self.cursor.execute(f"ALTER TABLE {schema}.results ADD COLUMN uid INTEGER")
+            self.cursor.execute(f"UPDATE {schema}.results SET uid = random() WHERE uid IS NULL")
+        self.cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {schema}.results_uid ON results (uid)")
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {schema}.results_uid_default AFTER INSERT ON results
+            WHEN NEW.uid IS NULL BEGIN
+                UPDATE results SET uid = random() WHERE id = NEW.id;
+            END
+        """)
+
+    def create_attempt_tables(self):
+        """Журнал попыток и ответов и сводные таблицы статистики вопросов.
+
+        question_stats и distractor_stats обновляются триггерами при каждой записи в журнал,
+        поэтому отчёт по вопросам не перечитывает журнал. Суммы sum_score* накапливаются
+        по завершённым попыткам и нужны для индекса дискриминации (см. analytics.py).
+        """
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.attempts (
+                id INTEGER PRIMARY KEY,  -- Случайный идентификатор, выдаётся на месте ученика
+                name TEXT NOT NULL,
+                seed INTEGER,
+                question_count INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                score INTEGER
+            )
+        """)
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.answers (
+                attempt_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                answer TEXT NOT NULL,
+                answer_key TEXT NOT NULL,
+                correct INTEGER NOT NULL,
+                answered_at REAL NOT NULL,
+                PRIMARY KEY (attempt_id, position)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.schema}.answers_question ON answers (question_id, correct)")
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.question_stats (
+                question_id INTEGER PRIMARY KEY,
+                answered INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                scored INTEGER NOT NULL DEFAULT 0,
+                scored_correct INTEGER NOT NULL DEFAULT 0,
+                sum_score REAL NOT NULL DEFAULT 0,
+                sum_score_sq REAL NOT NULL DEFAULT 0,
+                sum_correct_score REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.distractor_stats (
+                question_id INTEGER NOT NULL,
+                answer_key TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (question_id, answer_key)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {self.schema}.answers_stats AFTER INSERT ON answers BEGIN
+                INSERT INTO question_stats (question_id, answered, correct) VALUES (NEW.question_id, 1, NEW.correct)
+                ON CONFLICT(question_id) DO UPDATE SET answered = answered + 1, correct = correct + excluded.correct;
+                INSERT INTO distractor_stats (question_id, answer_key, answer, count)
+                SELECT NEW.question_id, NEW.answer_key, NEW.answer, 1 WHERE NEW.correct = 0
+                ON CONFLICT(question_id, answer_key) DO UPDATE SET count = count + 1;
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {self.schema}.attempts_finish AFTER UPDATE OF score ON attempts
+            WHEN OLD.score IS NULL AND NEW.score IS NOT NULL AND NEW.question_count > 0 BEGIN
+                INSERT INTO question_stats (question_id, scored, scored_correct,
+                                            sum_score, sum_score_sq, sum_correct_score)
+                SELECT question_id, 1, correct, share, share * share, correct * share
+                FROM (SELECT question_id, correct, NEW.score * 1.0 / NEW.question_count AS share
+                      FROM answers WHERE attempt_id = NEW.id) WHERE 1
+                ON CONFLICT(question_id) DO UPDATE SET
+                    scored = scored + 1,
+                    scored_correct = scored_correct + excluded.scored_correct,
+                    sum_score = sum_score + excluded.sum_score,
+                    sum_score_sq = sum_score_sq + excluded.sum_score_sq,
+                    sum_correct_score = sum_correct_score + excluded.sum_correct_score;
+            END
+        """)
 
     def insert_result(self, name, score):
         """Сохранение результата ученика в базе данных."""
         try:
-            self.cursor.execute("INSERT INTO results (name, score) VALUES (?, ?)", (name, score))
-            self.connection.commit()
+            with self.manager.transaction():
+                self.cursor.execute(f"INSERT INTO {self.schema}.results (name, score, uid) VALUES (?, ?, ?)",
+                                    (name, score, new_global_id()))
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось сохранить результат: {str(e)}")
+            report_error(f"Не удалось сохранить результат: {str(e)}")
+
+    def insert_result_async(self, name, score, attempt_id=None, uid=None):
+        """Сохранение результата в фоновом потоке без ожидания записи на диск (и завершение попытки)."""
+        # Результат попытки получает uid попытки, поэтому повторная отправка того же результата не задваивает его
+        if uid is None:
+            uid = new_global_id() if attempt_id is None else attempt_id
+        with self.group_async():  # Результат и завершение попытки записываются только вместе
+            self.submit_async(["INSERT OR IGNORE INTO results (name, score, uid) VALUES (?, ?, ?)",
+                               [name, score, uid]])
+            if attempt_id is not None:
+                self.submit_async(["UPDATE attempts SET score = ?, finished_at = ? WHERE id = ? AND score IS NULL",
+                                   [score, time.time(), attempt_id]])
+
+    def submit_async(self, record):
+        """Постановка записи [SQL, параметры] в очередь фонового потока (внутри group_async - в группу)."""
+        if self.group is not None:
+            self.group.append(record)
+            return
+        if self.writer is None:
+            self.writer = ResultWriter(self.db_path)
+            self.writer.start()
+        self.writer.submit(record)
+
+    @contextmanager
+    def group_async(self):
+        """Записи *_async внутри блока записываются фоновым потоком одной транзакцией (все или ни одной).
+
+        Вложенный блок добавляет записи во внешнюю группу.
+        """
+        if self.group is not None:
+            yield
+            return
+        self.group = []
+        try:
+            yield
+            records = self.group
+        finally:
+            self.group = None
+        if records:
+            self.submit_async({"records": records})
+
+    def start_attempt_async(self, name, seed, question_count, attempt_id=None):
+        """Начало попытки ученика в журнале. Возвращает идентификатор попытки (новый, если не задан)."""
+        attempt_id = new_global_id() if attempt_id is None else attempt_id
+        self.submit_async(["INSERT OR IGNORE INTO attempts (id, name, seed, question_count, started_at) VALUES (?, ?, ?, ?, ?)",
+                           [attempt_id, name, seed, question_count, time.time()]])
+        return attempt_id
+
+    def record_answer_async(self, attempt_id, position, question_id, answer, correct):
+        """Запись ответа на вопрос в журнал попытки."""
+        self.submit_async(["INSERT OR IGNORE INTO answers (attempt_id, position, question_id, answer, answer_key, "
+                           "correct, answered_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [attempt_id, position, question_id, answer, normalize_answer(answer), int(correct),
+                            time.time()]])
+
+    def flush(self):
+        """Ожидание записи всех результатов из фоновой очереди."""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def merge_results(self, filenames, progress=None):
+        """Слияние баз результатов с других мест в эту базу. Возвращает число новых результатов.
+
+        Файлы подключаются через ATTACH только для чтения группами (сколько позволяет SQLite), каждая
+        группа переносится одной транзакцией запросами INSERT ... SELECT. Результаты, попытки и ответы,
+        которые уже есть (по uid и id попытки), пропускаются, поэтому повторное слияние тех же
+        файлов ничего не меняет. В файлах старой версии без uid он вычисляется в запросе из записи.
+        Сводная статистика вопросов обновляется триггерами журнала. Ошибки передаются исключениями.
+        """
+        self.flush()
+        target = os.path.abspath(self.db_path)
+        filenames = [name for name in dict.fromkeys(filenames) if os.path.abspath(name) != target]
+        manager = ConnectionManager(self.db_path)  # Отдельное соединение, где база результатов - main
+        connection = manager.connection
+        connection.create_function("legacy_result_uid", 4, legacy_result_uid, deterministic=True)
+        getlimit = getattr(connection, "getlimit", None)
+        batch_size = getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if getlimit else 10
+        before = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        try:
+            for start in range(0, len(filenames), batch_size):
+                batch = filenames[start:start + batch_size]
+                schemas = [f"merge{number}" for number in range(len(batch))]
+                for filename, schema in zip(batch, schemas):
+                    connection.execute(f"ATTACH DATABASE ? AS {schema}", (merge_source_uri(filename),))
+                try:
+                    with manager.transaction():
+                        for filename, schema in zip(batch, schemas):
+                            self.merge_schema(connection, schema, filename)
+                finally:
+                    for schema in schemas:
+                        connection.execute(f"DETACH DATABASE {schema}")
+                if progress is not None:
+                    progress(start + len(batch), len(filenames))
+            return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] - before
+        finally:
+            manager.close()
+
+    def merge_schema(self, connection, schema, filename):
+        """Перенос результатов, попыток и ответов из подключённой схемы schema в main (без commit)."""
+        tables = {row[0] for row in connection.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+        if "results" not in tables:
+            raise ValueError(f"{filename}: в файле нет таблицы результатов")
+        # Файл старой версии без uid: uid вычисляется из места (первых записей файла), id и самой записи,
+        # поэтому повторное слияние того же файла даёт те же uid
+        seat = ";".join(f"{row[0]}:{row[1]}:{row[2]}" for row in connection.execute(
+            f"SELECT id, name, score FROM {schema}.results ORDER BY id LIMIT {MERGE_SEAT_KEY_ROWS}"))
+        columns = [row[1] for row in connection.execute(f"PRAGMA {schema}.table_info(results)")]
+        uid = "legacy_result_uid(:seat, id, name, score)"
+        uid = f"COALESCE(uid, {uid})" if "uid" in columns else uid
+        connection.execute(f"INSERT INTO main.results (name, score, uid) SELECT name, score, {uid} "
+                           f"FROM {schema}.results WHERE true ON CONFLICT (uid) DO NOTHING", {"seat": seat})
+        if "attempts" in tables and "answers" in tables:
+            # Попытки переносятся незавершёнными и завершаются после ответов: так триггер attempts_finish
+            # добавляет их в суммы для индекса дискриминации
+            connection.execute(f"INSERT OR IGNORE INTO main.attempts (id, name, seed, question_count, started_at) "
+                               f"SELECT id, name, seed, question_count, started_at FROM {schema}.attempts")
+            connection.execute(f"INSERT OR IGNORE INTO main.answers SELECT attempt_id, position, question_id, answer, "
+                               f"answer_key, correct, answered_at FROM {schema}.answers")
+            connection.execute(f"""
+                UPDATE main.attempts SET score = source.score, finished_at = source.finished_at
+                FROM {schema}.attempts AS source
+                WHERE main.attempts.id = source.id AND main.attempts.score IS NULL AND source.score IS NOT NULL
+            """)
 
     def get_results(self):
         """Получение всех результатов из базы данных."""
         try:
-            self.cursor.execute("SELECT name, score FROM results")
+            self.cursor.execute(f"SELECT name, score FROM {self.schema}.results")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            report_error(f"Не удалось получить результаты: {str(e)}")
+            return []
+
+    def get_results_since(self, after_id):
+        """Результаты с id больше after_id в порядке записи: (id, имя, баллы)."""
+        try:
+            self.cursor.execute(f"SELECT id, name, score FROM {self.schema}.results WHERE id > ? ORDER BY id",
+                                (after_id,))
             return self.cursor.fetchall()
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось получить результаты: {str(e)}")
+            report_error(f"Не удалось получить результаты: {str(e)}")
             return []
 
+    def get_result_totals(self):
+        """Итоги по ученикам одним запросом: (имя, попыток, сумма баллов, лучший результат, первый id, последний id)."""
+        self.cursor.execute(f"SELECT name, COUNT(*), SUM(score), MAX(score), MIN(id), MAX(id) "
+                            f"FROM {self.schema}.results GROUP BY name")
+        return self.cursor.fetchall()
+
+    def get_first_result_id(self):
+        """id самого раннего результата (None, если результатов нет); по нему видно, что база очищена."""
+        self.cursor.execute(f"SELECT MIN(id) FROM {self.schema}.results")
+        return self.cursor.fetchone()[0]
+
+    def data_version(self):
+        """Версия данных: меняется после записи через это соединение или любое другое (в том числе фоновой записи)."""
+        return (self.connection.total_changes,
+                self.cursor.execute(f"PRAGMA {self.schema}.data_version").fetchone()[0])
+
     def clear_results(self):
         """Очистка базы данных результатов."""
         try:
-            self.cursor.execute("DELETE FROM results")
-            self.connection.commit()
+            with self.manager.transaction():
+                for table in ("results", "answers", "attempts", "question_stats", "distractor_stats"):
+                    self.cursor.execute(f"DELETE FROM {self.schema}.{table}")
         except sqlite3.Error as e:
-            QMessageBox.critical(None, "Ошибка", f"Не удалось очистить результаты: {str(e)}")
+            report_error(f"Не удалось очистить результаты: {str(e)}")
 
     def close(self):
-        """Закрытие соединения с базой данных результатов."""
+        """Дозапись фоновой очереди и закрытие курсора (общее соединение закрывает ConnectionManager.close_all)."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
         if self.cursor is not None:
             self.cursor.close()
-        if self.connection is not None:
-            self.connection.close()
+            self.cursor = None
 
 
 class ResultsWindow(QWidget):
@@ -574,12 +3357,12 @@ class ResultsWindow(QWidget):
         self.results_database = results_database
         self.parent = parent
         self.setWindowTitle("Результаты учеников")
-        self.setGeometry(100, 100, 400, 300)
         self.results_list = QListWidget(self)
-        self.showFullScreen()
+        self.last_result_id = 0  # Последний показанный результат: дальше окно дозагружает только новые
 
         self.back_button = QPushButton("Назад", self)
         self.clear_button = QPushButton("Очистка", self)
+        self.merge_button = QPushButton("Добавить результаты с других компьютеров...", self)
         self.initUI()
 
     def initUI(self):
@@ -588,27 +3371,50 @@ class ResultsWindow(QWidget):
         layout.addWidget(QLabel("Результаты учеников:"))
         layout.addWidget(self.results_list)
         layout.addWidget(self.back_button)
+        layout.addWidget(self.merge_button)
         layout.addWidget(self.clear_button)
         font_size = "font-size: 24px; padding: 20px;"
         self.back_button.setStyleSheet(font_size)
+        self.merge_button.setStyleSheet(font_size)
         self.clear_button.setStyleSheet(font_size)
         self.setLayout(layout)
         self.load_results()
         self.back_button.clicked.connect(self.go_back)
+        self.merge_button.clicked.connect(self.merge)
         self.clear_button.clicked.connect(self.clear)
 
     def load_results(self):
         """Загрузка результатов учеников из базы данных"""
         self.results_list.clear()
+        self.last_result_id = 0
+        self.refresh()
+        if not self.results_list.count():
+            QMessageBox.information(self, "Информация", "Нет доступных результатов.")
+
+    def refresh(self):
+        """Дозагрузка результатов, записанных после последнего показа."""
         try:
-            results = self.results_database.get_results()
-            if not results:
-                QMessageBox.information(self, "Информация", "Нет доступных результатов.")
-            for name, score in results:
+            self.results_database.flush()  # Дописать результаты, ещё стоящие в очереди
+            for result_id, name, score in self.results_database.get_results_since(self.last_result_id):
                 self.results_list.addItem(f"{name}: {score} баллов")
+                self.last_result_id = result_id
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить результаты: {str(e)}")
 
+    def merge(self):
+        """Слияние с базами результатов, собранными с других компьютеров класса."""
+        filenames, _ = QFileDialog.getOpenFileNames(self, "Выберите базы результатов", "",
+                                                    "Базы результатов (*.db)")
+        if not filenames:
+            return
+        try:
+            merged = self.results_database.merge_results(filenames)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось объединить результаты: {str(e)}")
+            return
+        self.refresh()
+        QMessageBox.information(self, "Успех", f"Добавлено новых результатов: {merged}.")
+
     def clear(self):
         """Очистка базы данных результатов"""
         try:
@@ -619,9 +3425,8 @@ class ResultsWindow(QWidget):
             QMessageBox.critical(self, "Ошибка", f"Не удалось очистить результаты: {str(e)}")
 
     def go_back(self):
-        """Возврат к главному окну."""
-        self.parent.show()
-        self.close()
+        """Возврат к окну администратора."""
+        self.window().close_screen()
 
     def keyPressEvent(self, event):
         """Закрытие приложения при нажатии Esc"""
@@ -629,6 +3434,567 @@ class ResultsWindow(QWidget):
             quit()  # Закрываем приложение
 
 
+class Leaderboard:
+    """Рейтинг учеников по лучшему результату, который дополняется новыми строками results.
+
+    Для ученика хранятся число попыток, сумма баллов и лучший результат. Ключи сортировки лежат
+    в упорядоченном списке и переставляются через bisect, поэтому учёт нового результата не
+    зависит от размера истории, а первые места берутся срезом.
+    """
+
+    def __init__(self):
+        self.students = {}  # Имя -> [попыток, сумма баллов, лучший результат]
+        self.ranking = []  # Ключи (-лучший, -средний, имя) по возрастанию
+        self.count = 0
+        self.first_id = None  # Самый ранний учтённый результат
+        self.last_id = 0  # Последний учтённый результат
+
+    @staticmethod
+    def rank_key(name, attempts, total, best):
+        return -best, -total / attempts, name
+
+    def load(self, totals):
+        """Начальное заполнение по итогам get_result_totals (вместо чтения всей истории по строке)."""
+        for name, attempts, total, best, first_id, last_id in totals:
+            self.students[name] = [attempts, total, best]
+            self.count += attempts
+            self.first_id = first_id if self.first_id is None else min(self.first_id, first_id)
+            self.last_id = max(self.last_id, last_id)
+        self.ranking = sorted(self.rank_key(name, *stats) for name, stats in self.students.items())
+
+    def add(self, rows):
+        """Учёт новых результатов (id, имя, баллы) в порядке id."""
+        for result_id, name, score in rows:
+            stats = self.students.get(name)
+            if stats is None:
+                stats = self.students[name] = [0, 0, score]
+            else:
+                del self.ranking[bisect.bisect_left(self.ranking, self.rank_key(name, *stats))]
+            stats[0] += 1
+            stats[1] += score
+            stats[2] = max(stats[2], score)
+            bisect.insort(self.ranking, self.rank_key(name, *stats))
+            self.count += 1
+            if self.first_id is None:
+                self.first_id = result_id
+            self.last_id = result_id
+
+    def top(self, count):
+        """Первые count мест: (имя, лучший результат, средний результат, попыток)."""
+        return [(name, -best, -average, self.students[name][0]) for best, average, name in self.ranking[:count]]
+
+
+class LeaderboardWindow(QWidget):
+    """Рейтинг класса во время урока: пока окно на экране, новые результаты подхватываются опросом базы.
+
+    Опрос сначала сравнивает версию данных базы результатов и при неизменной базе ничего не читает;
+    иначе читаются только строки с id больше последнего учтённого, а в таблице переписываются
+    только изменившиеся места.
+    """
+
+    def __init__(self, results_database, parent):
+        super().__init__()
+        self.results_database = results_database
+        self.parent = parent
+        self.setWindowTitle("Рейтинг класса")
+        self.leaderboard = Leaderboard()
+        self.seen_version = None  # Версия базы при последнем опросе
+        self.shown = []  # Места, показанные в таблице
+        self.status_label = QLabel(self)
+        self.leaderboard_table = QTableWidget(0, 4, self)
+        self.leaderboard_table.setHorizontalHeaderLabels(["Ученик", "Лучший результат", "Средний", "Попыток"])
+        self.leaderboard_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.leaderboard_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(LEADERBOARD_POLL_MS)
+
+        self.back_button = QPushButton("Назад", self)
+        self.initUI()
+
+    def initUI(self):
+        """Инициализация пользовательского интерфейса окна рейтинга"""
+        layout = QVBoxLayout()
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.leaderboard_table)
+        layout.addWidget(self.back_button)
+        self.back_button.setStyleSheet("font-size: 24px; padding: 20px;")
+        self.setLayout(layout)
+        self.refresh()
+        self.poll_timer.timeout.connect(self.refresh)
+        self.back_button.clicked.connect(self.go_back)
+
+    def refresh(self):
+        """Учёт результатов, записанных с прошлого опроса (если база изменилась)."""
+        try:
+            version = self.results_database.data_version()
+            if version == self.seen_version:
+                return
+            self.seen_version = version
+            if self.leaderboard.first_id is not None and \
+                    self.results_database.get_first_result_id() != self.leaderboard.first_id:
+                self.leaderboard = Leaderboard()  # Результаты очищены: рейтинг строится заново
+            if self.leaderboard.first_id is None:
+                self.leaderboard.load(self.results_database.get_result_totals())
+            else:
+                self.leaderboard.add(self.results_database.get_results_since(self.leaderboard.last_id))
+        except sqlite3.Error as e:
+            self.status_label.setText(f"Не удалось обновить рейтинг: {str(e)}")
+            return
+        self.show_top()
+
+    def show_top(self):
+        """Перезапись только тех строк таблицы, места в которых изменились."""
+        top = self.leaderboard.top(LEADERBOARD_SIZE)
+        self.leaderboard_table.setRowCount(len(top))
+        for row, place in enumerate(top):
+            if row < len(self.shown) and self.shown[row] == place:
+                continue
+            name, best, average, attempts = place
+            for column, text in enumerate([name, str(best), f"{average:.1f}", str(attempts)]):
+                self.leaderboard_table.setItem(row, column, QTableWidgetItem(text))
+        self.shown = top
+        self.status_label.setText(f"Учеников: {len(self.leaderboard.students)}, "
+                                  f"результатов: {self.leaderboard.count}.")
+
+    def showEvent(self, event):
+        """Опрос базы идёт, только пока окно на экране."""
+        self.poll_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.poll_timer.stop()
+        super().hideEvent(event)
+
+    def go_back(self):
+        """Возврат к окну администратора."""
+        self.window().close_screen()
+
+    def keyPressEvent(self, event):
+        """Закрытие приложения при нажатии Esc"""
+        if event.key() == Qt.Key.Key_Escape:
+            quit()
+
+
+class StatisticsWindow(QWidget):
+    """Сложность, дискриминация и частые ошибки по вопросам (из сводных таблиц журнала ответов)."""
+
+    def __init__(self, results_database, parent, pack_path=None):
+        super().__init__()
+        self.results_database = results_database
+        self.parent = parent
+        self.pack_path = pack_path  # Пакеты тестов, из которых берутся тексты вопросов на месте ученика
+        self.setWindowTitle("Статистика вопросов")
+        self.statistics_table = QTableWidget(0, 5, self)
+        self.statistics_table.setHorizontalHeaderLabels(
+            ["Вопрос", "Ответов", "Верно", "Дискриминация", "Частые ошибки"])
+        self.statistics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.statistics_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        self.back_button = QPushButton("Назад", self)
+        self.rebuild_button = QPushButton("Пересчитать по журналу", self)
+        self.initUI()
+
+    def initUI(self):
+        """Инициализация пользовательского интерфейса окна статистики"""
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Статистика вопросов (самые трудные сверху):"))
+        layout.addWidget(self.statistics_table)
+        layout.addWidget(self.back_button)
+        layout.addWidget(self.rebuild_button)
+        font_size = "font-size: 24px; padding: 20px;"
+        self.back_button.setStyleSheet(font_size)
+        self.rebuild_button.setStyleSheet(font_size)
+        self.setLayout(layout)
+        self.load_statistics()
+        self.back_button.clicked.connect(self.go_back)
+        self.rebuild_button.clicked.connect(self.rebuild)
+
+    def load_statistics(self):
+        """Заполнение таблицы из сводных таблиц статистики."""
+        import analytics  # Нужен только в этом окне
+        packs = self.open_packs()
+        try:
+            self.results_database.flush()  # Дописать ответы, ещё стоящие в очереди
+            statistics = analytics.item_statistics(self.results_database, questions=packs)
+            frequent = analytics.distractors(self.results_database)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить статистику: {str(e)}")
+            return
+        finally:
+            for pack in packs or ():
+                pack.close()
+        self.statistics_table.setRowCount(len(statistics))
+        for row, (question_id, question, answered, difficulty, discrimination) in enumerate(statistics):
+            wrong = ", ".join(f"{answer} ({count})" for answer, count in frequent.get(question_id, []))
+            cells = [question, str(answered), f"{difficulty:.0%}",
+                     "-" if discrimination is None else f"{discrimination:+.2f}", wrong]
+            for column, text in enumerate(cells):
+                self.statistics_table.setItem(row, column, QTableWidgetItem(text))
+
+    def open_packs(self):
+        """Пакеты тестов для текстов вопросов (None - тексты из базы вопросов); повреждённые пропускаются."""
+        if self.pack_path is None:
+            return None
+        packs = []
+        for path in find_quiz_packs(self.pack_path):
+            try:
+                packs.append(QuizPack(path))
+            except (OSError, ValueError):
+                pass
+        return packs
+
+    def rebuild(self):
+        """Пересчёт сводных таблиц по всему журналу ответов."""
+        import analytics
+        try:
+            analytics.rebuild_statistics(self.results_database)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось пересчитать статистику: {str(e)}")
+            return
+        self.load_statistics()
+
+    def refresh(self):
+        """Сводные таблицы поддерживаются триггерами, поэтому перечитать их дёшево."""
+        self.load_statistics()
+
+    def go_back(self):
+        """Возврат к окну администратора."""
+        self.window().close_screen()
+
+    def keyPressEvent(self, event):
+        """Закрытие приложения при нажатии Esc"""
+        if event.key() == Qt.Key.Key_Escape:
+            quit()
+
+
+class DiagnosticsWindow(QWidget):
+    """Длительность операций баз данных и обработчиков окон по данным замеров (metrics)."""
+
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+        self.setWindowTitle("Диагностика")
+        self.status_label = QLabel(self)
+        self.metrics_table = QTableWidget(0, 6, self)
+        self.metrics_table.setHorizontalHeaderLabels(
+            ["Операция", "Вызовов", "Среднее, мс", "p50, мс", "p95, мс", "Максимум, мс"])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.metrics_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        self.enable_button = QPushButton("Включить замеры", self)
+        self.refresh_button = QPushButton("Обновить", self)
+        self.reset_button = QPushButton("Сбросить", self)
+        self.back_button = QPushButton("Назад", self)
+        self.initUI()
+
+    def initUI(self):
+        """Инициализация пользовательского интерфейса окна диагностики"""
+        layout = QVBoxLayout()
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.metrics_table)
+        layout.addWidget(self.enable_button)
+        layout.addWidget(self.refresh_button)
+        layout.addWidget(self.reset_button)
+        layout.addWidget(self.back_button)
+        font_size = "font-size: 24px; padding: 20px;"
+        for button in (self.enable_button, self.refresh_button, self.reset_button, self.back_button):
+            button.setStyleSheet(font_size)
+        self.setLayout(layout)
+        self.load_metrics()
+        self.enable_button.clicked.connect(self.enable)
+        self.refresh_button.clicked.connect(self.load_metrics)
+        self.reset_button.clicked.connect(self.reset)
+        self.back_button.clicked.connect(self.go_back)
+
+    def load_metrics(self):
+        """Заполнение таблицы сводкой замеров."""
+        if metrics.enabled:
+            journal = f" Журнал: {metrics.file_path}." if metrics.file_path else ""
+            self.status_label.setText(f"Замеры включены.{journal}")
+        else:
+            self.status_label.setText("Замеры выключены (запуск с флагом --metrics или кнопка ниже).")
+        self.enable_button.setEnabled(not metrics.enabled)
+        rows = metrics.summary()
+        self.metrics_table.setRowCount(len(rows))
+        for row, (name, count, *seconds) in enumerate(rows):
+            cells = [name, str(count)] + [f"{value * 1000:.2f}" for value in seconds]
+            for column, text in enumerate(cells):
+                self.metrics_table.setItem(row, column, QTableWidgetItem(text))
+
+    def enable(self):
+        """Включение замеров без перезапуска (для окон, открытых после этого)."""
+        enable_metrics()
+        self.load_metrics()
+
+    def reset(self):
+        metrics.reset()
+        self.load_metrics()
+
+    def refresh(self):
+        self.load_metrics()
+
+    def go_back(self):
+        """Возврат к окну администратора."""
+        self.window().close_screen()
+
+    def keyPressEvent(self, event):
+        """Закрытие приложения при нажатии Esc"""
+        if event.key() == Qt.Key.Key_Escape:
+            quit()
+
+
+class PixmapCache:
+    """Подготовленные к показу изображения с вытеснением давно не использованных (только поток окон)."""
+
+    def __init__(self, capacity=MEDIA_CACHE_SIZE):
+        self.capacity = capacity
+        self.pixmaps = OrderedDict()
+
+    def get(self, key):
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.pixmaps[key] = pixmap
+        self.pixmaps.move_to_end(key)
+        while len(self.pixmaps) > self.capacity:
+            self.pixmaps.popitem(last=False)
+
+
+# Общий кэш изображений окон ученика; ключ - (id вопроса, контрольная сумма изображения)
+pixmap_cache = PixmapCache()
+
+
+class MediaLoader(QObject):
+    """Чтение и декодирование изображений вопросов в фоновом потоке; готовое изображение приходит сигналом."""
+
+    image_ready = pyqtSignal(int, int, QImage)  # id вопроса, контрольная сумма, изображение
+
+    STOP = object()
+
+    def __init__(self, db_name="quiz.db", parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.requests = queue.Queue()
+        self.pending = set()
+        self.thread = threading.Thread(target=self.run, name="MediaLoader", daemon=True)
+        self.thread.start()
+
+    def request(self, question_id, checksum):
+        """Постановка изображения в очередь (повторные запросы того же изображения пропускаются)."""
+        if (question_id, checksum) not in self.pending:
+            self.pending.add((question_id, checksum))
+            self.requests.put((question_id, checksum))
+
+    def run(self):
+        database = Database(self.db_name)
+        try:
+            while True:
+                request = self.requests.get()
+                if request is self.STOP:
+                    break
+                question_id, checksum = request
+                data = database.read_question_media(question_id)
+                image = QImage.fromData(data) if data else QImage()
+                if image.width() > MEDIA_MAX_WIDTH or image.height() > MEDIA_MAX_HEIGHT:
+                    image = image.scaled(MEDIA_MAX_WIDTH, MEDIA_MAX_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+                self.image_ready.emit(question_id, checksum, image)
+                self.pending.discard(request)
+        finally:
+            database.manager.close()
+
+    def stop(self):
+        self.requests.put(self.STOP)
+
+
+class QuestionSearcher(QObject):
+    """Поиск вопросов в фоновом потоке со своим соединением; результаты приходят сигналом."""
+
+    results_ready = pyqtSignal(int, list)  # Номер запроса, найденные строки
+
+    STOP = object()
+
+    def __init__(self, db_name="quiz.db", parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.requests = queue.Queue()
+        self.latest_generation = 0
+        self.thread = threading.Thread(target=self.run, name="QuestionSearcher", daemon=True)
+        self.thread.start()
+
+    def search(self, generation, text, offset, limit, test_id=None):
+        """Постановка запроса; запросы устаревших поколений пропускаются."""
+        self.latest_generation = max(self.latest_generation, generation)
+        self.requests.put((generation, text, offset, limit, test_id))
+
+    def run(self):
+        database = Database(self.db_name)
+        try:
+            while True:
+                request = self.requests.get()
+                if request is self.STOP:
+                    break
+                generation, text, offset, limit, test_id = request
+                if generation < self.latest_generation:
+                    continue  # Пользователь уже ввёл новый запрос
+                self.results_ready.emit(generation, database.search_questions(text, limit, offset, test_id))
+        finally:
+            database.manager.close()
+
+    def stop(self):
+        self.requests.put(self.STOP)
+
+
+class QuestionTransfer(QObject):
+    """Импорт или экспорт вопросов в фоновом потоке со своим соединением, с прогрессом и отменой."""
+
+    progress = pyqtSignal(int)  # Выполнено, в тысячных долях
+    completed = pyqtSignal(object)  # Результат метода Database
+    failed = pyqtSignal(str)  # Текст ошибки
+
+    def __init__(self, db_name, method, *args, parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.method = method
+        self.args = args
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="QuestionTransfer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        """Запрос отмены; поток прервётся на ближайшей проверке, импорт откатится."""
+        self.cancel_event.set()
+
+    def report_progress(self, done, total):
+        self.progress.emit(min(1000, done * 1000 // total) if total else 1000)
+
+    def run(self):
+        database = Database(self.db_name)
+        try:
+            result = getattr(database, self.method)(*self.args, progress=self.report_progress,
+                                                    cancelled=self.cancel_event.is_set)
+            self.completed.emit(result)
+        except TransferCancelled:
+            self.failed.emit("Операция отменена.")
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            database.manager.close()
+
+
+class QuestionListModel(QAbstractListModel):
+    """Модель списка вопросов с постраничной подгрузкой из базы данных по id.
+
+    В режиме поиска страницы ранжированных совпадений запрашиваются у QuestionSearcher.
+    """
+
+    def __init__(self, database, parent=None, searcher=None):
+        super().__init__(parent)
+        self.database = database
+        self.searcher = searcher
+        self.rows = []  # Загруженные строки (id, вопрос, ответ)
+        self.last_id = 0
+        self.exhausted = False
+        self.search_text = ""
+        self.test_id = None  # Показываются только вопросы этого теста (None - все)
+        self.generation = 0
+        self.fetching = False
+        if searcher is not None:
+            searcher.results_ready.connect(self.add_search_results)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        question_id, question, correct_answer = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{question} | {correct_answer}"  # Показываем вопрос и ответ
+        if role == Qt.ItemDataRole.UserRole:
+            return question_id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Подгрузка следующей страницы вопросов."""
+        if parent.isValid():
+            return
+        if self.search_text:
+            self.fetching = True
+            self.searcher.search(self.generation, self.search_text, len(self.rows), QUESTION_PAGE_SIZE, self.test_id)
+            return
+        self.append_page(self.database.get_questions_page(self.last_id, QUESTION_PAGE_SIZE, self.test_id))
+
+    def append_page(self, page):
+        """Добавление загруженной страницы в конец списка."""
+        if len(page) < QUESTION_PAGE_SIZE:
+            self.exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.last_id = page[-1][0]
+        self.endInsertRows()
+
+    def add_search_results(self, generation, page):
+        """Страница результатов поиска из фонового потока."""
+        if generation != self.generation:
+            return  # Ответ на устаревший запрос
+        self.fetching = False
+        self.append_page(page)
+
+    def reset(self, search_text="", test_id=None):
+        """Сброс модели: загруженные строки отбрасываются и подгружаются заново по мере прокрутки."""
+        self.beginResetModel()
+        self.test_id = test_id
+        self.rows = []
+        self.last_id = 0
+        self.exhausted = False
+        self.fetching = False
+        self.search_text = search_text.strip() if self.searcher is not None else ""
+        self.generation += 1
+        self.endResetModel()
+
+    def question_id(self, row):
+        """Идентификатор вопроса в строке row."""
+        return self.rows[row][0]
+
+    def append_question(self, question_id, question, correct_answer):
+        """Добавление одной строки без перезагрузки списка."""
+        if not self.exhausted or self.search_text:
+            return  # Строка появится при подгрузке следующей страницы
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append((question_id, question, correct_answer))
+        self.last_id = question_id
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        """Удаление одной строки без перезагрузки списка."""
+        self.remove_rows([row])
+
+    def remove_rows(self, rows):
+        """Удаление нескольких строк; соседние строки удаляются одним диапазоном."""
+        rows = sorted(set(rows), reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            self.endRemoveRows()
+
+
 class TeacherWindow(QWidget):
     """Окно для управления вопросами."""
 
@@ -638,18 +4004,38 @@ class TeacherWindow(QWidget):
         self.parent = parent
 
         self.setWindowTitle("Учитель")
-        self.setGeometry(100, 100, 400, 300)
-        self.showFullScreen()
 
         self.question_input = QLineEdit(self)
+        self.question_input.setPlaceholderText("Шаблон с параметрами: {a:1..9} + {b:1..9} (ответ: =a + b)")
         self.answer_input = QLineEdit(self)
+        self.answer_input.setPlaceholderText(f"Несколько правильных ответов разделяются символом '{ANSWER_SEPARATOR}'")
         self.submit_button = QPushButton("Добавить вопрос", self)
-        self.delete_button = QPushButton("Удалить вопрос", self)
+        self.delete_button = QPushButton("Удалить выбранные вопросы", self)
         self.delete_all_button = QPushButton("Удалить все вопросы", self)
         self.load_button = QPushButton("Загрузить вопросы из файла", self)  # Кнопка для загрузки
         self.save_button = QPushButton("Сохранить вопросы в файл", self)  # Кнопка для сохранения
+        self.sync_button = QPushButton("Синхронизировать с папкой...", self)
         self.back_button = QPushButton("Назад", self)
-        self.question_list = QListWidget(self)
+        self.test_filter = QComboBox(self)  # Показ всех вопросов или только вопросов одного теста
+        self.add_to_test_button = QPushButton("Добавить выбранные вопросы в тест...", self)
+        self.remove_from_test_button = QPushButton("Убрать выбранные вопросы из теста", self)
+        self.delete_test_button = QPushButton("Удалить тест", self)
+        self.attach_image_button = QPushButton("Прикрепить изображение к вопросу...", self)
+        self.remove_image_button = QPushButton("Убрать изображение у вопроса", self)
+        self.search_input = QLineEdit(self)
+        self.search_input.setPlaceholderText("Поиск по вопросам и ответам...")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.searcher = QuestionSearcher(os.path.basename(self.database.db_path), self)
+        self.question_model = QuestionListModel(self.database, self, self.searcher)
+        self.question_list = QListView(self)
+        self.question_list.setUniformItemSizes(True)  # Отрисовываются только видимые строки
+        self.question_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.question_list.setModel(self.question_model)
+        self.transfer = None  # Текущий фоновый импорт или экспорт
+        self.sync_folder = ""  # Последняя синхронизированная папка
+        self.loaded_version = None  # Версия базы вопросов, по которой заполнен список
 
         self.initUI()
 
@@ -665,56 +4051,249 @@ class TeacherWindow(QWidget):
         layout.addWidget(self.answer_input)
         layout.addWidget(self.submit_button)
         layout.addWidget(QLabel("Список вопросов:"))
+        layout.addWidget(self.test_filter)
+        layout.addWidget(self.search_input)
         layout.addWidget(self.question_list)
+        layout.addWidget(self.add_to_test_button)
+        layout.addWidget(self.remove_from_test_button)
+        layout.addWidget(self.delete_test_button)
+        layout.addWidget(self.attach_image_button)
+        layout.addWidget(self.remove_image_button)
         layout.addWidget(self.delete_button)
         layout.addWidget(self.delete_all_button)
         layout.addWidget(self.load_button)  # Добавлено
         layout.addWidget(self.save_button)  # Добавлено
+        layout.addWidget(self.sync_button)
         layout.addWidget(self.back_button)
 
         font_size = "font-size: 24px; padding: 20px;"
         self.back_button.setStyleSheet(font_size)
         self.load_button.setStyleSheet(font_size)  # Стили для кнопки загрузки
         self.save_button.setStyleSheet(font_size)  # Стили для кнопки сохранения
+        self.sync_button.setStyleSheet(font_size)
         self.delete_all_button.setStyleSheet(font_size)
         self.delete_button.setStyleSheet(font_size)
         self.submit_button.setStyleSheet(font_size)
+        self.add_to_test_button.setStyleSheet(font_size)
+        self.remove_from_test_button.setStyleSheet(font_size)
+        self.delete_test_button.setStyleSheet(font_size)
+        self.attach_image_button.setStyleSheet(font_size)
+        self.remove_image_button.setStyleSheet(font_size)
 
         self.submit_button.clicked.connect(self.add_question)
+        self.add_to_test_button.clicked.connect(self.add_selected_to_test)
+        self.remove_from_test_button.clicked.connect(self.remove_selected_from_test)
+        self.delete_test_button.clicked.connect(self.delete_test)
+        self.attach_image_button.clicked.connect(self.attach_image)
+        self.remove_image_button.clicked.connect(self.remove_image)
+        self.load_tests()
+        self.test_filter.currentIndexChanged.connect(self.load_questions)
         self.delete_button.clicked.connect(self.delete_question)
         self.delete_all_button.clicked.connect(self.delete_all_questions)
         self.back_button.clicked.connect(self.go_back)
         self.load_button.clicked.connect(self.load_questions_from_file)  # Связываем
         self.save_button.clicked.connect(self.save_questions_to_file)  # Связываем
+        self.sync_button.clicked.connect(self.sync_questions_with_folder)
+        self.search_input.textChanged.connect(self.search_timer.start)  # Поиск после паузы в наборе
+        self.search_timer.timeout.connect(self.load_questions)
 
         self.setLayout(layout)
 
+    def start_transfer(self, title, method, *args):
+        """Запуск фонового импорта или экспорта с окном прогресса и кнопкой отмены."""
+        self.transfer = QuestionTransfer(os.path.basename(self.database.db_path), method, *args, parent=self)
+        dialog = QProgressDialog(title, "Отмена", 0, 1000, self)
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(self.transfer.cancel)
+        self.transfer.progress.connect(dialog.setValue)
+        self.transfer.completed.connect(dialog.close)
+        self.transfer.failed.connect(dialog.close)
+        self.transfer.failed.connect(lambda message: QMessageBox.warning(self, "Ошибка", message))
+        self.load_button.setEnabled(False)
+        self.save_button.setEnabled(False)
+        self.sync_button.setEnabled(False)
+        self.transfer.completed.connect(self.finish_transfer)
+        self.transfer.failed.connect(self.finish_transfer)
+        self.transfer.start()
+        return self.transfer
+
+    def finish_transfer(self):
+        """Возврат кнопок загрузки и сохранения после фоновой операции."""
+        self.transfer = None
+        self.load_button.setEnabled(True)
+        self.save_button.setEnabled(True)
+        self.sync_button.setEnabled(True)
+
     def load_questions_from_file(self):
-        """Загрузка вопросов из выбранного текстового файла."""
-        filename, _ = QFileDialog.getOpenFileName(self, "Выберите файл", "", "Text Files (*.txt)")
+        """Загрузка вопросов из выбранного файла (формат по расширению) в фоновом потоке."""
+        filename, _ = QFileDialog.getOpenFileName(self, "Выберите файл", "", question_file_filter())
         if filename:
-            self.database.load_questions_from_txt(filename)
-            QMessageBox.information(self, "Успех", "Вопросы загружены из файла!")
-            self.load_questions()  # Обновляем список вопросов после загрузки
+            answer = QMessageBox.question(self, "Повторяющиеся вопросы",
+                                          "Обновить ответы у вопросов, которые уже есть в базе?\n"
+                                          "(Нет - такие вопросы будут пропущены)")
+            update_answers = answer == QMessageBox.StandardButton.Yes
+            transfer = self.start_transfer("Загрузка вопросов...", "import_questions", filename, update_answers)
+            transfer.completed.connect(self.show_import_report)
+            transfer.failed.connect(self.load_questions)  # Импорт откатился, список мог измениться извне
+
+    def show_import_report(self, report):
+        """Итоги импорта: число добавленных, повторов и отклонённых записей."""
+        inserted, rejected, duplicates = report
+        summary = f"Загружено вопросов: {inserted}.\nУже были в базе: {duplicates}."
+        if rejected:
+            details = "\n".join(f"Строка {number}: {reason}" for number, _, reason in rejected[:20])
+            if len(rejected) > 20:
+                details += f"\n... и ещё {len(rejected) - 20}"
+            QMessageBox.warning(self, "Загрузка завершена",
+                                f"{summary}\nОтклонено строк: {len(rejected)}\n{details}")
+        else:
+            QMessageBox.information(self, "Успех", f"Вопросы загружены из файла!\n{summary}")
+        self.load_questions()  # Обновляем список вопросов после загрузки
+
+    def sync_questions_with_folder(self):
+        """Синхронизация банка с папкой файлов вопросов в фоновом потоке (только новые и изменённые файлы)."""
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку с вопросами", self.sync_folder)
+        if folder:
+            self.sync_folder = folder
+            transfer = self.start_transfer("Синхронизация с папкой...", "sync_question_folder", folder)
+            transfer.completed.connect(self.show_sync_report)
+            transfer.failed.connect(self.load_questions)  # Файлы до отмены уже синхронизированы
+
+    def show_sync_report(self, report):
+        """Итоги синхронизации: обработанные файлы, добавленные и удалённые вопросы, отклонённые записи."""
+        updated, removed, inserted, deleted, rejected = report
+        summary = (f"Обновлено файлов: {updated}, удалено файлов: {removed}.\n"
+                   f"Добавлено вопросов: {inserted}, удалено вопросов: {deleted}.")
+        if rejected:
+            details = "\n".join(f"{filename}, строка {number}: {reason}" for filename, number, _, reason in rejected[:20])
+            if len(rejected) > 20:
+                details += f"\n... и ещё {len(rejected) - 20}"
+            QMessageBox.warning(self, "Синхронизация завершена",
+                                f"{summary}\nОтклонено строк: {len(rejected)}\n{details}")
+        else:
+            QMessageBox.information(self, "Успех", f"Папка синхронизирована!\n{summary}")
+        self.load_questions()
 
     def save_questions_to_file(self):
-        """Сохранение вопросов в выбранный текстовый файл."""
-        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить файл", "", "Text Files (*.txt)")
+        """Сохранение вопросов в выбранный файл (формат по расширению) в фоновом потоке."""
+        filename, selected_filter = QFileDialog.getSaveFileName(self, "Сохранить файл", "", question_file_filter())
         if filename:
-            self.database.save_questions_to_txt(filename)
-            QMessageBox.information(self, "Успех", "Вопросы сохранены в файл!")
+            if not os.path.splitext(filename)[1]:
+                filename += next((fmt.extension for fmt in QUESTION_FORMATS.values()
+                                  if fmt.extension in selected_filter), TxtQuestionFormat.extension)
+            transfer = self.start_transfer("Сохранение вопросов...", "export_questions", filename)
+            transfer.completed.connect(self.show_export_report)
+
+    def show_export_report(self, report):
+        """Итоги сохранения: число записанных вопросов и вопросы, пропущенные форматом файла."""
+        written, skipped = report
+        if skipped:
+            details = "\n".join(f"Вопрос {question_id} ({question[:40]!r}): {reason}"
+                                for question_id, question, reason in skipped[:20])
+            if len(skipped) > 20:
+                details += f"\n... и ещё {len(skipped) - 20}"
+            QMessageBox.warning(self, "Сохранение завершено",
+                                f"Сохранено вопросов: {written}.\nПропущено вопросов: {len(skipped)}\n{details}")
+        else:
+            QMessageBox.information(self, "Успех", f"Вопросы сохранены в файл! ({written})")
 
     def delete_all_questions(self):
         """Удаление всех вопросов из базы данных."""
         self.database.clear_questions()
         self.load_questions()
 
+    def load_tests(self, selected_test_id=None):
+        """Заполнение списка тестов для фильтра вопросов."""
+        self.test_filter.blockSignals(True)
+        self.test_filter.clear()
+        self.test_filter.addItem(ALL_QUESTIONS_TITLE, None)
+        for test_id, name, _, _ in self.database.get_tests():
+            self.test_filter.addItem(name, test_id)
+            if test_id == selected_test_id:
+                self.test_filter.setCurrentIndex(self.test_filter.count() - 1)
+        self.test_filter.blockSignals(False)
+        self.update_test_buttons()
+
+    def update_test_buttons(self):
+        """Убрать вопросы и удалить тест можно, только когда в фильтре выбран тест."""
+        test_selected = self.test_filter.currentData() is not None
+        self.remove_from_test_button.setEnabled(test_selected)
+        self.delete_test_button.setEnabled(test_selected)
+
+    def selected_question_ids(self):
+        """Идентификаторы выделенных в списке вопросов."""
+        return [index.data(Qt.ItemDataRole.UserRole) for index in self.question_list.selectionModel().selectedIndexes()]
+
+    def add_selected_to_test(self):
+        """Добавление выделенных вопросов в существующий или новый тест."""
+        question_ids = self.selected_question_ids()
+        if not question_ids:
+            QMessageBox.warning(self, "Ошибка", "Выберите вопросы для добавления в тест.")
+            return
+        names = [name for _, name, _, _ in self.database.get_tests()]
+        name, ok = QInputDialog.getItem(self, "Добавить в тест",
+                                        "Выберите тест или введите название нового:", names, 0, True)
+        name = name.strip()
+        if not ok or not name:
+            return
+        test_id = self.database.add_test(name)
+        if test_id is None:
+            return
+        self.database.add_questions_to_test(test_id, question_ids)
+        self.load_tests(self.test_filter.currentData())
+        QMessageBox.information(self, "Успех", f"Вопросов добавлено в тест \"{name}\": {len(question_ids)}.")
+
+    def remove_selected_from_test(self):
+        """Исключение выделенных вопросов из теста, выбранного в фильтре."""
+        indexes = self.question_list.selectionModel().selectedIndexes()
+        if not indexes:
+            QMessageBox.warning(self, "Ошибка", "Выберите вопросы, которые нужно убрать из теста.")
+            return
+        self.database.remove_questions_from_test(self.test_filter.currentData(), self.selected_question_ids())
+        self.question_model.remove_rows([index.row() for index in indexes])
+
+    def delete_test(self):
+        """Удаление теста, выбранного в фильтре (вопросы остаются в банке)."""
+        answer = QMessageBox.question(self, "Удаление теста",
+                                      f"Удалить тест \"{self.test_filter.currentText()}\"? Вопросы останутся в базе.")
+        if answer == QMessageBox.StandardButton.Yes:
+            self.database.delete_test(self.test_filter.currentData())
+            self.load_tests()
+            self.load_questions()
+
+    def attach_image(self):
+        """Прикрепление изображения из файла к выделенному вопросу."""
+        question_ids = self.selected_question_ids()
+        if len(question_ids) != 1:
+            QMessageBox.warning(self, "Ошибка", "Выберите один вопрос.")
+            return
+        filename, _ = QFileDialog.getOpenFileName(self, "Выберите изображение", "",
+                                                  "Изображения (*.png *.jpg *.jpeg *.gif *.bmp)")
+        if filename:
+            if QImage(filename).isNull():
+                QMessageBox.warning(self, "Ошибка", "Файл не является изображением.")
+                return
+            self.database.set_question_media(question_ids[0], filename)
+
+    def remove_image(self):
+        """Удаление изображения у выделенных вопросов."""
+        question_ids = self.selected_question_ids()
+        if not question_ids:
+            QMessageBox.warning(self, "Ошибка", "Выберите вопрос.")
+            return
+        for question_id in question_ids:
+            self.database.remove_question_media(question_id)
+
     def load_questions(self):
-        """Загрузка вопросов из базы данных в список."""
-        self.question_list.clear()
-        questions = self.database.get_questions()
-        for q in questions:
-            self.question_list.addItem(f"{q[1]} | {q[2]}")  # Показываем вопрос и ответ
+        """Загрузка вопросов (или результатов поиска) в список; страницы подгружаются по мере прокрутки."""
+        self.update_test_buttons()
+        self.loaded_version = self.database.data_version()
+        self.question_model.reset(self.search_input.text(), self.test_filter.currentData())
+        if self.question_model.canFetchMore():
+            self.question_model.fetchMore()
 
     def add_question(self):
         """Добавление нового вопроса."""
@@ -722,21 +4301,30 @@ class TeacherWindow(QWidget):
         answer = self.answer_input.text()
 
         if question and answer:
-            self.database.insert_question(question, answer)
-            self.load_questions()
+            error = check_template(question, answer)
+            if error:
+                QMessageBox.warning(self, "Ошибка", f"Ошибка в шаблоне вопроса: {error}")
+                return
+            if self.database.find_question(question) is not None:
+                QMessageBox.warning(self, "Ошибка", "Такой вопрос уже есть в базе.")
+                return
+            question_id = self.database.insert_question(question, answer)
+            if question_id is not None:
+                if self.test_filter.currentData() is not None:
+                    self.database.add_questions_to_test(self.test_filter.currentData(), [question_id])
+                self.question_model.append_question(question_id, question, answer)
             self.question_input.clear()
             self.answer_input.clear()
         else:
             QMessageBox.warning(self, "Ошибка", "Вопрос и ответ должны быть заполнены!")
 
     def delete_question(self):
-        """Удаление выбранного вопроса из базы данных."""
-        selected_item = self.question_list.currentItem()
-        if selected_item:
-            question_text = selected_item.text().split(" | ")[0]  # Получаем текст вопроса
-            question_id = self.database.get_questions()[self.question_list.currentRow()][0]
-            self.database.delete_question(question_id)
-            self.load_questions()
+        """Удаление выбранных вопросов из базы данных."""
+        indexes = self.question_list.selectionModel().selectedIndexes()
+        if indexes:
+            rows = [index.row() for index in indexes]
+            self.database.delete_questions(self.selected_question_ids())
+            self.question_model.remove_rows(rows)
         else:
             QMessageBox.warning(self, "Ошибка", "Выберите вопрос для удаления.")
 
@@ -745,16 +4333,101 @@ class TeacherWindow(QWidget):
         if event.key() == Qt.Key.Key_Escape:
             quit()  # Закрываем приложение
 
+    def refresh(self):
+        """Перечитывание тестов и списка, только если база вопросов изменилась с последней загрузки."""
+        if self.database.data_version() != self.loaded_version:
+            self.load_tests(self.test_filter.currentData())
+            self.load_questions()
+
     def go_back(self):
-        """Возврат к главному окну."""
-        self.parent.show()  # Показываем родительское окно (главное окно)
-        self.close()
+        """Возврат к окну администратора."""
+        self.window().close_screen()
+
+    def closeEvent(self, event):
+        """Остановка фонового поиска и отмена импорта или экспорта при закрытии окна."""
+        self.searcher.stop()
+        if self.transfer is not None:
+            self.transfer.cancel()
+        super().closeEvent(event)
+
+
+# Что замеряется при включённых замерах: все открытые методы баз данных и обработчики окон
+INSTRUMENTED_METHODS = [
+    (Database, None),
+    (ResultsDatabase, None),
+    (StudentWindow, ["check_answer", "load_question"]),
+    (TeacherWindow, ["load_questions"]),
+    (ResultsWindow, ["load_results"]),
+    (LeaderboardWindow, ["refresh"]),
+]
+
+
+def enable_metrics(file_path=None):
+    """Включение замеров; действует на окна, открытые после включения."""
+    if not metrics.enabled:
+        for cls, names in INSTRUMENTED_METHODS:
+            instrument(cls, names)
+        metrics.enabled = True
+        atexit.register(metrics.flush)
+    if file_path:
+        metrics.file_path = file_path
 
 
 if __name__ == '__main__':
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # Процессы разбора файлов синхронизации в собранной программе
+    # Служебные режимы ниже завершаются через sys.exit: базы закрываются с переносом журналов WAL
+    atexit.register(ConnectionManager.close_all)
+
+    if "--deduplicate" in sys.argv:
+        # Обслуживание: python main.py --deduplicate удаляет повторяющиеся вопросы и завершает работу
+        print(f"Удалено дубликатов: {Database().deduplicate_questions()}")
+        sys.exit(0)
+
+    if "--sync-folder" in sys.argv[:-1]:
+        # python main.py --sync-folder ПАПКА - загрузка новых и изменённых файлов вопросов (например, по расписанию)
+        try:
+            updated, removed, inserted, deleted, rejected = Database().sync_question_folder(
+                sys.argv[sys.argv.index("--sync-folder") + 1],
+                progress=lambda done, total: print(f"Обработано файлов: {done} из {total}"))
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Ошибка: не удалось синхронизировать папку: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        for filename, number, _, reason in rejected:
+            print(f"{filename}, строка {number}: {reason}", file=sys.stderr)
+        print(f"Обновлено файлов: {updated}, удалено файлов: {removed}, "
+              f"добавлено вопросов: {inserted}, удалено вопросов: {deleted}")
+        sys.exit(0)
+
+    if "--merge-results" in sys.argv:
+        # python main.py --merge-results ФАЙЛЫ_ИЛИ_ПАПКИ... - слияние баз результатов, собранных с мест учеников
+        results_database = ResultsDatabase()
+        try:
+            merged = results_database.merge_results(
+                find_results_files(sys.argv[sys.argv.index("--merge-results") + 1:]),
+                progress=lambda done, total: print(f"Обработано файлов: {done} из {total}"))
+            print(f"Добавлено результатов: {merged}")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"Ошибка: не удалось объединить результаты: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            results_database.close()
+        sys.exit(0)
+
+    if METRICS_ENABLED:
+        enable_metrics(METRICS_FILE)
+
     app = QApplication(sys.argv)
-    database = Database()  # Создание базы данных
-    parent = QuizApp()  # Создание главного окна
-    parent.database = database  # Передача базы данных
+    startup_phase("QApplication создан")
+    # --server АДРЕС[:ПОРТ] - ученики получают вопросы с сервера класса (см. server.py)
+    server_address = sys.argv[sys.argv.index("--server") + 1] if "--server" in sys.argv[:-1] else None
+    # --pack ФАЙЛ_ИЛИ_ПАПКА - место ученика только для чтения: вопросы из пакетов, собранных в окне администратора
+    pack_path = sys.argv[sys.argv.index("--pack") + 1] if "--pack" in sys.argv[:-1] else None
+    parent = QuizApp(server_address, pack_path)  # Создание главного окна (базы данных открываются при первом обращении)
+    startup_phase("главное окно создано")
+    app.aboutToQuit.connect(parent.shutdown)  # Дозапись результатов перед выходом
     parent.show()  # Показать главное окно
+    # Срабатывает в первом проходе цикла событий, когда окно уже показано
+    QTimer.singleShot(0, lambda: startup_phase("первое окно на экране"))
     sys.exit(app.exec())
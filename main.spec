@@ -10,9 +10,13 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Модули, которые программе не нужны: меньше архив и быстрее запуск
+    excludes=[
+        'tkinter', 'unittest', 'pydoc', 'doctest', 'pdb', 'asyncio', 'xmlrpc', 'lib2to3',
+        'PyQt6.QtNetwork', 'PyQt6.QtQml', 'PyQt6.QtQuick', 'PyQt6.QtSvg', 'PyQt6.QtPdf',
+    ],
     noarchive=False,
-    optimize=0,
+    optimize=2,
 )
 pyz = PYZ(a.pure)
 
@@ -25,7 +29,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # Сжатые UPX библиотеки распаковываются при каждом запуске
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -38,7 +42,7 @@ coll = COLLECT(
     a.binaries,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,  # Сжатые UPX библиотеки распаковываются при каждом запуске
     upx_exclude=[],
     name='main',
 )
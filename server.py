@@ -0,0 +1,165 @@
+"""Сервер класса: раздаёт выборки вопросов ученикам и принимает их результаты.
+
+Запуск на компьютере учителя:
+    python server.py --port 8765 --duration 10 --count 20
+На местах учеников:
+    python main.py --server 192.168.0.10:8765
+"""
+import argparse
+import asyncio
+import json
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from main import ConnectionManager, Database, ResultsDatabase, DEFAULT_SERVER_PORT
+
+# Максимальный размер тела запроса (пачка результатов)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# Порциями такого размера дочитывается и отбрасывается слишком большое тело запроса
+DISCARD_CHUNK_SIZE = 64 * 1024
+
+
+class QuizServer:
+    """Асинхронный HTTP-сервер поверх Database и ResultsDatabase (соединения keep-alive)."""
+
+    def __init__(self, database, results_database, duration=60, question_count=0, typo_tolerance=0):
+        self.database = database
+        self.results_database = results_database
+        self.settings = {"duration": duration, "question_count": question_count, "typo_tolerance": typo_tolerance}
+
+    def get_questions(self, query):
+        """Выборка вопросов вместе с ключами ответов, чтобы ответы проверялись на месте ученика."""
+        count = int(query.get("count", [self.settings["question_count"]])[0])
+        seed = int(query["seed"][0])
+        test_id = int(query["test"][0]) if "test" in query else None
+        questions = []
+        for question_id in self.database.draw_questions(count, seed, test_id):
+            row = self.database.get_question(question_id)
+            if row is not None:
+                questions.append({"id": row[0], "question": row[1], "correct_answer": row[2],
+                                  "answer_keys": sorted(self.database.get_answer_keys(question_id))})
+        return {"seed": seed, "questions": questions}
+
+    def post_results(self, payload):
+        """Приём пачки результатов и записей журнала попыток.
+
+        Сначала проверяются все записи пачки, затем они ставятся в очередь фоновой записи ResultsDatabase
+        одной группой (одна транзакция): неверная пачка отвергается целиком и ничего не записывает,
+        поэтому повторная отправка той же пачки ничего не задваивает.
+        """
+        results = payload["results"]
+        if not isinstance(results, list) or not all(isinstance(result, dict) for result in results):
+            raise TypeError("results должен быть списком записей")
+        calls = [self.result_call(result) for result in results]
+        with self.results_database.group_async():
+            for method, arguments in calls:
+                method(*arguments)
+        return {"accepted": len(calls)}
+
+    def result_call(self, result):
+        """Проверенная запись пачки: (метод ResultsDatabase, аргументы). Ошибки - KeyError/TypeError/ValueError."""
+        kind = result.get("kind", "result")
+        if kind == "attempt":
+            seed = result.get("seed")
+            return self.results_database.start_attempt_async, (
+                str(result["name"]), None if seed is None else int(seed), int(result["question_count"]),
+                int(result["attempt_id"]))
+        if kind == "answer":
+            return self.results_database.record_answer_async, (
+                int(result["attempt_id"]), int(result["position"]), int(result["question_id"]),
+                str(result["answer"]), bool(result["correct"]))
+        if kind != "result":
+            raise ValueError(f"неизвестный вид записи '{kind}'")
+        attempt_id, uid = result.get("attempt_id"), result.get("uid")
+        return self.results_database.insert_result_async, (
+            str(result["name"]), int(result["score"]), None if attempt_id is None else int(attempt_id),
+            None if uid is None else int(uid))
+
+    def route(self, method, target, body):
+        """Обработка запроса. Возвращает (HTTP-статус, ответ)."""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            if method == "GET" and url.path == "/settings":
+                return 200, self.settings
+            if method == "GET" and url.path == "/questions":
+                return 200, self.get_questions(query)
+            if method == "POST" and url.path == "/results":
+                return 200, self.post_results(json.loads(body.decode("utf-8")))
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {"error": f"Неверный запрос: {str(e)}"}
+        return 404, {"error": "Не найдено"}
+
+    async def handle_connection(self, reader, writer):
+        """Обслуживание одного соединения: запросы читаются, пока клиент его не закроет."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if length > MAX_BODY_SIZE:
+                    # Тело дочитывается без сохранения: иначе клиент получит сброс соединения вместо ответа
+                    while length:
+                        length -= len(await reader.readexactly(min(length, DISCARD_CHUNK_SIZE)))
+                    status, payload = 413, {"error": f"Запрос больше {MAX_BODY_SIZE} байт, отправьте его частями"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = self.route(method, target, body)
+
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, started=None):
+        """Запуск сервера; started (asyncio.Event) выставляется, когда порт открыт."""
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=512)
+        if started is not None:
+            started.set()
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер класса для программы проверки знаний")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument("--duration", type=int, default=1, help="время теста в минутах")
+    parser.add_argument("--count", type=int, default=0, help="число вопросов в попытке (0 - все)")
+    parser.add_argument("--typos", type=int, default=0, help="допустимое число опечаток в ответе")
+    args = parser.parse_args()
+
+    results_database = ResultsDatabase()
+    server = QuizServer(Database(), results_database, args.duration * 60, args.count, args.typos)
+    print(f"Сервер класса запущен на {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results_database.close()  # Дозапись принятых результатов
+        server.database.close()
+        ConnectionManager.close_all()  # Перенос журналов WAL в файлы баз
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import answer_keys_for, is_answer_correct, normalize_answer
+
+
+class NormalizeAnswerTest(unittest.TestCase):
+    def test_text(self):
+        self.assertEqual(normalize_answer("  Ёлка   Зелёная "), "елка зеленая")
+
+    def test_equal_numbers(self):
+        for first, second in [("4", "4.0"), ("4,5", "4.50"), ("+007", "7"), ("-0", "0"), (".5", "0,5"),
+                              ("100.0", "100"), ("0,125", "0.125")]:
+            with self.subTest(first=first, second=second):
+                self.assertEqual(normalize_answer(first), normalize_answer(second))
+
+    def test_large_integers_stay_exact(self):
+        self.assertNotEqual(normalize_answer("9007199254740993"), normalize_answer("9007199254740992"))
+        self.assertEqual(normalize_answer("9007199254740993"), "9007199254740993")
+
+    def test_ambiguous_comma_is_text(self):
+        self.assertEqual(normalize_answer("1,000"), "1,000")
+        self.assertNotEqual(normalize_answer("1,000"), normalize_answer("1"))
+        self.assertEqual(normalize_answer("1,000,000"), "1,000,000")
+        self.assertEqual(normalize_answer("1.5,2"), "1.5,2")
+
+    def test_not_numbers(self):
+        for text in ["1e5", "inf", "nan", "1_000", "0x10"]:
+            with self.subTest(text=text):
+                self.assertEqual(normalize_answer(text), text)
+
+
+class IsAnswerCorrectTest(unittest.TestCase):
+    def test_several_answers(self):
+        keys = answer_keys_for("Москва | г. Москва")
+        self.assertTrue(is_answer_correct("москва", keys))
+        self.assertTrue(is_answer_correct("Г.  МОСКВА", keys))
+        self.assertFalse(is_answer_correct("Питер", keys))
+
+    def test_typos_only_in_long_text_answers(self):
+        self.assertTrue(is_answer_correct("Масква", answer_keys_for("Москва"), typo_tolerance=1))
+        self.assertFalse(is_answer_correct("1235", answer_keys_for("1234"), typo_tolerance=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
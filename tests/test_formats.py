@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ANSWER_SEPARATOR, QUESTION_FORMATS, Database, question_hash
+
+QUESTIONS = [
+    ("Столица России?", "Москва | г. Москва", ("География",)),
+    ("2 + 2 = ?", "4", ("Математика", "Устный счёт")),
+    ("Текст со \"знаками\", запятой и 'кавычками'", "да", ()),
+]
+# Вопросы, которые текстовый формат 'вопрос;ответ' передать не может
+SPECIAL_QUESTIONS = [
+    ("a;b\nc", "d", ("Особые",)),
+    ("Вопрос", "ответ;с точкой с запятой", ()),
+]
+
+
+class QuestionFormatRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.initial_directory = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)  # Database создаёт папку db в текущем каталоге
+        self.databases = []
+
+    def tearDown(self):
+        for database in self.databases:
+            database.close()
+            database.manager.close()
+        os.chdir(self.initial_directory)
+        self.directory.cleanup()
+
+    def database(self, name, questions=()):
+        database = Database(name)
+        self.databases.append(database)
+        if questions:
+            with database.manager.transaction():
+                database.upsert_questions([row + (question_hash(row[0]),) for row in questions], update_answers=False)
+        return database
+
+    def contents(self, database):
+        rows = database.connection.execute(
+            "SELECT question, correct_answer, (SELECT group_concat(name, '|') FROM (SELECT tests.name FROM "
+            "test_questions JOIN tests ON tests.id = test_questions.test_id "
+            "WHERE test_questions.question_id = questions.id ORDER BY tests.name)) FROM questions").fetchall()
+        # JSON Lines хранит ответы списком, поэтому пробелы вокруг разделителя ответов не сохраняются
+        return sorted((question, tuple(part.strip() for part in answer.split(ANSWER_SEPARATOR)),
+                       tuple(tests.split("|")) if tests else ()) for question, answer, tests in rows)
+
+    def round_trip(self, extension, questions):
+        source = self.database(f"source{extension}.db", questions)
+        filename = "questions" + extension
+        written, skipped = source.export_questions(filename)
+        target = self.database(f"target{extension}.db")
+        inserted, rejected, _ = target.import_questions(filename)
+        self.assertEqual(rejected, [])
+        self.assertEqual(inserted, written)
+        return self.contents(source), self.contents(target), skipped
+
+    def test_formats_keep_questions_intact(self):
+        for extension in QUESTION_FORMATS:
+            questions = QUESTIONS if extension == ".txt" else QUESTIONS + SPECIAL_QUESTIONS
+            with self.subTest(extension=extension):
+                source, target, skipped = self.round_trip(extension, questions)
+                self.assertEqual(skipped, [])
+                if extension == ".txt":  # Тесты в текстовом формате не сохраняются
+                    source = [row[:2] + ((),) for row in source]
+                self.assertEqual(target, source)
+
+    def test_txt_skips_questions_it_cannot_represent(self):
+        source, target, skipped = self.round_trip(".txt", QUESTIONS + SPECIAL_QUESTIONS)
+        self.assertEqual(sorted(question for _, question, _ in skipped),
+                         sorted(question for question, _, _ in SPECIAL_QUESTIONS))
+        self.assertEqual([row[0] for row in target], sorted(row[0] for row in QUESTIONS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TemplateError, check_template, compile_expression, question_template
+
+
+class CompileExpressionTest(unittest.TestCase):
+    def evaluate(self, text, **values):
+        return compile_expression(text, list(values))(values)
+
+    def test_arithmetic(self):
+        self.assertEqual(self.evaluate("a * b + 1", a=3, b=4), 13)
+        self.assertEqual(self.evaluate("-a ** 2 // 3 % 5", a=4), 4)
+        self.assertEqual(self.evaluate("max(a, 2) / 4", a=6), 1.5)
+        self.assertEqual(self.evaluate("round(a / 3, 2)", a=2), 0.67)
+
+    def test_rejects_code(self):
+        for text in ["__import__('os')", "a.real", "[a]", "a if a else 1", "'x' * 3", "abs(a, key=1)",
+                     "open('f')", "lambda: 1", "a < 2"]:
+            with self.subTest(text=text), self.assertRaises(TemplateError):
+                compile_expression(text, ["a"])
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(TemplateError):
+            compile_expression("a + c", ["a"])
+
+    def test_too_long(self):
+        with self.assertRaises(TemplateError):
+            compile_expression("+".join(["1"] * 200), [])
+
+    def test_large_results_rejected_before_computing(self):
+        for text in ["a ** 1000", "(((((a ** 64) ** 64) ** 64) ** 64) ** 64)", "a ** 200 * a ** 200",
+                     "(a ** 40) * (a ** 40) * (a ** 40) * (a ** 40)", "round(a, -10 ** 9)"]:
+            with self.subTest(text=text), self.assertRaises(TemplateError):
+                self.evaluate(text, a=9)
+
+    def test_small_powers_allowed(self):
+        self.assertEqual(self.evaluate("a ** 64", a=9), 9 ** 64)
+        self.assertEqual(self.evaluate("1 ** (10 ** 30)"), 1)
+        self.assertEqual(self.evaluate("a ** -2", a=2), 0.25)
+
+
+class QuestionTemplateTest(unittest.TestCase):
+    def test_plain_question_is_not_template(self):
+        self.assertIsNone(question_template("2 + 2", "4"))
+        self.assertIsNone(question_template("{a:1..9}", "4"))
+
+    def test_instantiate_is_reproducible(self):
+        template = question_template("{a:10..99} - {b:1..a} = ?", "=a - b")
+        text, answer = template.instantiate(7, 42)
+        self.assertEqual(template.instantiate(7, 42), (text, answer))
+        first, second = text.split(" = ")[0].split(" - ")
+        self.assertEqual(int(answer), int(first) - int(second))
+        self.assertTrue(1 <= int(second) <= int(first) <= 99)
+
+    def test_escaped_braces_and_step(self):
+        template = question_template("{{x}} = {a:2..10:2}", "=a / 2")
+        text, answer = template.instantiate(1, 1)
+        value = int(text.split(" = ")[1])
+        self.assertTrue(text.startswith("{x} = "))
+        self.assertEqual(value % 2, 0)
+        self.assertEqual(answer, str(value // 2))
+
+    def test_check_template_errors(self):
+        self.assertIsNone(check_template("{a:1..9} + 1", "=a + 1"))
+        self.assertIn("пустой диапазон", check_template("{a:5..1}", "=a"))
+        self.assertIn("дважды", check_template("{a:1..2} {a:1..2}", "=a"))
+        self.assertIsNotNone(check_template("{a:0..0}", "=1 / a"))
+
+    def test_check_template_nested_power_is_fast(self):
+        start = time.perf_counter()
+        self.assertIsNotNone(check_template("{a:2..9}", "=(((((a**64)**64)**64)**64)**64)"))
+        self.assertLess(time.perf_counter() - start, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()